@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import numpy as np
+import scipy.sparse as sp
 from tqdm import tqdm
 
 try:
@@ -14,72 +15,367 @@ except ImportError:
     print("using nnls from scipy.optimize")
     from scipy.optimize import nnls
 
+from nnls_batch import nnls_gram, nnls_active
+from simplex import simplex_lstsq_gram, simplex_lstsq, simplex_tol
+from parallel import ParallelAStep, effective_n_jobs
+from telemetry import no_telemetry
 
-# residual sum of squares, given X, A, Z
-def RSS_Z(X, A, Z):
-    # RSS(k) = || X - AZ ||_F^2
-    tmp = X - np.dot(A, Z)
-    return np.sum(tmp ** 2)
 
+# residual sum of squares, given X, A, Z; X_norm2 = ||X||_F^2 can be
+# passed if it is known, e.g. in the AA loops where X is fixed
+def RSS_Z(X, A, Z, X_norm2=None, rtol=1e-6, block_size=4096):
+    # RSS(k) = || X - AZ ||_F^2
+    #        = ||X||_F^2 - 2 tr(A^t X Z^t) + tr(Z^t A^t A Z)
+    # which only needs k x k and k x d temporaries
+    if X_norm2 is None:
+        X_norm2 = _norm2(X, block_size)
+    AZ_norm2 = np.sum(_dot_T(A, A, block_size) * np.dot(Z, Z.T))
+    rss = X_norm2 - 2 * np.sum(_dot_T(A, X, block_size) * Z) + AZ_norm2
+    # the identity loses about eps * (||X||^2 + ||AZ||^2) / RSS in relative
+    # accuracy; if that is too much, sum the residuals block by block
+    if rss <= 0 or np.finfo(float).eps * (X_norm2 + AZ_norm2) > rtol * rss:
+        rss = 0.0
+        for start in range(0, X.shape[0], block_size):
+            stop = min(start + block_size, X.shape[0])
+            tmp = _dense(X[start:stop]) - np.dot(A[start:stop], Z)
+            rss += np.sum(tmp ** 2)
+    return rss
+
+
+# float32 data is kept in float32, so is A; everything else is float64
+def _work_dtype(X):
+    return np.float32 if X.dtype == np.float32 else np.float64
+
+
+# A^t X, accumulated in float64 block by block if A or X is float32, so
+# that neither is converted to float64 as a whole; X^t A instead of A^t X
+# also works for scipy.sparse X
+def _dot_T(A, X, block_size=4096):
+    if A.dtype == np.float64 and X.dtype == np.float64:
+        return np.asarray(X.T @ A).T
+    AtX = np.zeros((A.shape[1], X.shape[1]))
+    for start in range(0, X.shape[0], block_size):
+        stop = min(start + block_size, X.shape[0])
+        Ab = np.asarray(A[start:stop], dtype=float)
+        AtX += np.asarray(X[start:stop].T.astype(float) @ Ab).T
+    return AtX
+
+
+# squared Frobenius norm, block by block
+def _norm2(X, block_size=4096):
+    if sp.issparse(X):
+        return np.sum(X.data ** 2, dtype=float)
+    return sum(
+        np.sum(np.square(X[start : start + block_size]), dtype=float)
+        for start in range(0, X.shape[0], block_size)
+    )
+
+
+# A_init warm-starts each row from the support of a previous solution;
+# solver="simplex" solves the constrained problem directly (and from A_init
+# itself), without the M penalty row
+def ArchetypalAnalysis_compute_A(
+    X,
+    Z,
+    M=1000.0,
+    solver="nnls",
+    block_size=4096,
+    A_init=None,
+    return_iterations=False,
+    n_jobs=None,
+):
+    if effective_n_jobs(n_jobs) > 1:
+        # split the rows across a process pool sharing X and Z
+        with ParallelAStep(X, Z.shape[0], n_jobs) as pool:
+            A, iterations = pool.compute_A(Z, M, solver, block_size, A_init)
+        if return_iterations:
+            return A, iterations
+        return A
 
-def ArchetypalAnalysis_compute_A(X, Z, M=1000.0):
     # initialization
     n = X.shape[0]
     k = Z.shape[0]
-    A = np.zeros((n, k))
+    A = np.zeros((n, k), dtype=_work_dtype(X))
+    iterations = np.zeros(n, dtype=int)  # only counted for warm starts
 
     # || Z^t ai - xi ||^2
     # set up optimization of ai,
     # i.e., the convex combination for each data point xi
     Q = np.vstack((Z.T, M * np.ones(k)))
-    for i in range(n):
-        ai, rnorm = nnls(Q, np.hstack((X[i], M)))
-        A[i] = ai.T
-
+    if solver == "nnls":
+        for start in range(0, n, block_size):
+            # scipy.sparse X is densified block by block
+            Xb = _dense(X[start : start + block_size])
+            for i in range(start, start + Xb.shape[0]):
+                if A_init is None:
+                    ai, rnorm = nnls(Q, np.hstack((Xb[i - start], M)))
+                else:
+                    ai, Pi, iterations[i] = nnls_active(
+                        Q, np.hstack((Xb[i - start], M)), A_init[i] > 0
+                    )
+                A[i] = ai.T
+    elif solver == "batch":
+        # Q^t Q is shared by all rows; Q^t [xi, M] = Z xi + M^2
+        G = np.dot(Q.T, Q)
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            # (X Z^t)^t also works for scipy.sparse X
+            C = np.asarray(X[start:stop] @ Z.T).T + M * M
+            P = None if A_init is None else A_init[start:stop].T > 0
+            At, iterations[start:stop] = nnls_gram(G, C, P)
+            A[start:stop] = At.T
+    elif solver == "simplex":
+        G = np.dot(Z, Z.T)
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            C = np.asarray(X[start:stop] @ Z.T)
+            A0 = None if A_init is None else A_init[start:stop]
+            A[start:stop], iterations[start:stop] = simplex_lstsq_gram(G, C, A0)
+    else:
+        raise NotImplementedError
+
+    if return_iterations:
+        return A, iterations
     return A
 
 
+# B_init warm-starts each archetype from the support of a previous solution;
+# candidates restricts the B-step to a subset of the columns of X^t, which
+# is checked against the KKT conditions of the full problem
+def ArchetypalAnalysis_compute_B(
+    X,
+    Z,
+    M=1000.0,
+    B_init=None,
+    return_iterations=False,
+    candidates=None,
+    kkt_tol=None,
+    solver="nnls",
+):
+    # initialization
+    X = _dense(X)
+    if solver == "simplex":
+        B, iterations = _compute_B_simplex(X, Z, B_init, candidates, kkt_tol)
+        if return_iterations:
+            return B, iterations
+        return B
+    n = X.shape[0]
+    k = Z.shape[0]
+    B = np.zeros((k, n))
+    iterations = np.zeros(k, dtype=int)  # only counted for warm starts
+
+    # || X^t bj - zj ||^2
+    # set up optimization of bj,
+    # i.e. the convex combination for each archetype zj
+    # Q is float32 for float32 X, the columns passed to the solvers are not
+    Q = np.vstack((X.T, M * np.ones(n, dtype=X.dtype)))
+    if candidates is None:
+        candidates = np.arange(n)
+    else:
+        candidates = np.asarray(candidates)
+    Qc = np.asarray(Q[:, candidates], dtype=float)
+    if kkt_tol is None:
+        kkt_tol = 10 * max(Q.shape) * np.finfo(float).eps * np.abs(Q).max() ** 2
+    fallbacks = 0
+    for j in range(k):
+        zj = np.hstack((Z[j], M))
+        if B_init is None:
+            b, rnorm = nnls(Qc, zj)
+        else:
+            b, Pj, iterations[j] = nnls_active(Qc, zj, B_init[j, candidates] > 0)
+        B[j, candidates] = b
+
+        if candidates.size < n:
+            # the pruned solution is optimal for all columns iff no column
+            # outside the support has a positive gradient
+            w = np.dot(Q.T, zj - np.dot(Qc, b))
+            if w.max() > kkt_tol:
+                # fall back to the full column set, starting from the support
+                fallbacks += 1
+                B[j], Pj, it = nnls_active(np.asarray(Q, dtype=float), zj, B[j] > 0)
+                iterations[j] += it
+
+    if fallbacks > 0:
+        print(
+            "B-step fell back to all columns for %d of %d archetypes" % (fallbacks, k)
+        )
+
+    if return_iterations:
+        return B, iterations
+    return B
+
+
+# B-step without the M penalty; the KKT conditions of the simplex problem
+# hold iff no column has a smaller gradient than the support (on which the
+# gradient is constant)
+def _compute_B_simplex(X, Z, B_init, candidates, kkt_tol):
+    n = X.shape[0]
+    k = Z.shape[0]
+    if candidates is None:
+        candidates = np.arange(n)
+    else:
+        candidates = np.asarray(candidates)
+    if kkt_tol is None:
+        # above the duality gap at which simplex_lstsq stops
+        kkt_tol = 10 * simplex_tol(X)
+    B = np.zeros((k, n))
+    B0 = None if B_init is None else B_init[:, candidates]
+    B[:, candidates], iterations = simplex_lstsq(X[candidates], Z, B0)
+    if candidates.size < n:
+        grad = np.dot(np.dot(B, X) - Z, X.T)
+        violated = np.flatnonzero(grad.min(axis=1) < np.sum(B * grad, axis=1) - kkt_tol)
+        if violated.size > 0:
+            # fall back to all columns, starting from the pruned solution
+            B[violated], it = simplex_lstsq(X, Z[violated], B[violated])
+            iterations[violated] += it
+            print(
+                "B-step fell back to all columns for %d of %d archetypes"
+                % (violated.size, k)
+            )
+    return B, iterations
+
+
+# indices of points on (or close to) the boundary of the convex hull of X:
+# the extremes along random directions are vertices of the hull, points far
+# from the mean are likely to be
+def boundary_candidates(X, size, n_directions=None):
+    n = X.shape[0]
+    if size >= n:
+        return np.arange(n)
+    if n_directions is None:
+        n_directions = size // 4
+    U = np.random.randn(X.shape[1], n_directions)
+    proj = np.dot(X - X.mean(axis=0), U)
+    ind = np.unique(np.hstack((proj.argmax(axis=0), proj.argmin(axis=0))))
+    # fill up with the points furthest from the mean
+    dist = np.sum((X - X.mean(axis=0)) ** 2, axis=1)
+    dist[ind] = -np.inf
+    fill = np.argsort(dist)[::-1][: max(size - ind.size, 0)]
+    return np.union1d(ind, fill)
+
+
+# keep the candidate set up to date: add the current support of B (which
+# includes the columns of any KKT fallback) and the points that are worst
+# explained by the current archetypes, i.e. those outside their hull
+def _update_candidates(candidates, X, A, B, Z, n_residual):
+    support = np.flatnonzero((B > 0).any(axis=0))
+    residual = np.sum((X - np.dot(A, Z)) ** 2, axis=1)
+    threshold = residual.mean()
+    residual[candidates] = -np.inf
+    worst = np.argsort(residual)[::-1][:n_residual]
+    worst = worst[residual[worst] > threshold]
+    return np.union1d(np.union1d(candidates, support), worst)
+
+
 def ArchetypalAnalysis(
-    X, Z, k, max_iterations=250, stop=True, epsilon=1e-3, M=1000.0, verbose=False
+    X,
+    Z,
+    k,
+    max_iterations=250,
+    stop=True,
+    epsilon=1e-3,
+    M=1000.0,
+    verbose=False,
+    solver="nnls",
+    warm_start=False,
+    n_jobs=None,
+    candidates=None,
+    telemetry=None,
+    extrapolate=False,
+    A_init=None,
+    B_init=None,
+    X_norm2=None,
 ):
     # initialization
+    if telemetry is None:
+        telemetry = no_telemetry
+    # extrapolate the archetypes between iterations, see _Extrapolation
+    extrapolation = _Extrapolation() if extrapolate else None
+    X = _dense(X)  # the B-step works on all of X^t, scipy.sparse is densified
     n = X.shape[0]
-    A = np.zeros((n, k))  # convex combination for each data point xi, i=1..n
-    B = np.zeros((k, n))  # convex combination for each archetype  zj, j=1..k
+    # with warm_start, A_init and B_init seed the active sets of the first
+    # iteration, e.g. from a fit with fewer archetypes
+    # convex combination for each data point xi, i=1..n
+    A = np.zeros((n, k)) if A_init is None else A_init
+    # convex combination for each archetype  zj, j=1..k
+    B = np.zeros((k, n)) if B_init is None else B_init
 
     iteration = 0
+    pool = ParallelAStep(X, k, n_jobs) if effective_n_jobs(n_jobs) > 1 else None
+    if X_norm2 is None:
+        X_norm2 = _norm2(X)  # for RSS_Z
+    if candidates is not None and np.isscalar(candidates):
+        # size of the pruned candidate set for the B-step
+        n_residual = max(int(candidates) // 10, 1)
+        candidates = boundary_candidates(X, int(candidates))
+    elif candidates is not None:
+        n_residual = max(len(candidates) // 10, 1)
     rss = [-999]  # will be removed before returning
 
-    Q = np.vstack((X.T, M * np.ones(n)))
     for iteration in tqdm(range(1, max_iterations + 1), desc="AA"):
         # optimization of all ai's,
         # i.e., the convex combination for each data point xi
-        A = ArchetypalAnalysis_compute_A(X, Z, M)
+        # (if warm, start from the supports of the previous iteration)
+        with telemetry.phase("A"):
+            A, iter_A = _compute_A(X, Z, M, solver, A if warm_start else None, pool)
 
         # update (intermediate) archetypes
         # X = A Z
         # A^t X = A^t A Z
         # ( A^t A )^-1 A^t X = Z
         # Z = np.linalg.solve( np.dot( A.T, A ), np.dot( A.T, X ) )
-        Z = np.linalg.lstsq(np.dot(A.T, A), np.dot(A.T, X), rcond=None)[0]
+        with telemetry.phase("Z"):
+            Z = np.linalg.lstsq(_dot_T(A, A), _dot_T(A, X), rcond=None)[0]
         # Z = np.linalg.lstsq(np.dot(A.T, A), np.dot(A.T, X))[0]
         # Z = np.dot( np.dot( np.linalg.inv( np.dot( A.T, A ) ), A.T ), X )
 
         # optimization of all bj's,
         # i.e. the convex combination for each archetype zj
-        for j in range(k):
-            b, rnorm = nnls(Q, np.hstack((Z[j], M)))
-            B[j] = b.T
-
-        # update archetypes
-        Z = np.dot(B, X)
+        with telemetry.phase("B"):
+            B, iter_B = ArchetypalAnalysis_compute_B(
+                X,
+                Z,
+                M,
+                B_init=B if warm_start else None,
+                return_iterations=True,
+                candidates=candidates,
+                solver=_B_solver(solver),
+            )
+
+            # update archetypes
+            Z = _dot_T(B.T, X)
 
         # compute new RSS and store it
-        rss.append(RSS_Z(X, A, Z))
+        with telemetry.phase("RSS"):
+            rss.append(RSS_Z(X, A, Z, X_norm2))
+
+        if candidates is not None:
+            with telemetry.phase("candidates"):
+                candidates = _update_candidates(candidates, X, A, B, Z, n_residual)
+        telemetry.iteration(
+            iteration,
+            rss[-1],
+            _counted(iter_A, solver, warm_start),
+            _counted(iter_B, _B_solver(solver), warm_start),
+        )
 
         if verbose:
             print("Iteration %2d // RSS=%.3f" % (iteration, rss[-1]))
 
+        if extrapolation is not None:
+            # whether this iteration started from extrapolated archetypes
+            extrapolated = extrapolation.extrapolated
+            Z, accepted = extrapolation.step(Z, B, rss[-1])
+            if not accepted:
+                # go on from the archetypes of the last accepted iteration,
+                # unless a plain iteration from them already increased RSS
+                rss.pop()
+                if stop and not extrapolated:
+                    break
+                continue
+        if verbose and warm_start and solver != "simplex":
+            _print_warm_start_iterations(iter_A, iter_B)
+
         # stop conditions
         converged = np.abs(rss[-1] - rss[-2]) / np.abs(rss[-1]) < epsilon
         increasing = rss[-1] > rss[-2] and len(rss) > 2
@@ -93,54 +389,139 @@ def ArchetypalAnalysis(
         if stop and (converged or increasing or outOfIter):
             break
 
-    A = ArchetypalAnalysis_compute_A(X, Z, M)
+    if extrapolation is not None:
+        Z, B = extrapolation.Z, extrapolation.B
+    with telemetry.phase("A"):
+        A = _compute_A(X, Z, M, solver, None, pool)[0]
+    if pool is not None:
+        pool.close()
+    telemetry.finish(rss=rss[-1])
 
     return Z, A, B, rss[1:]
 
 
 def weightedArchetypalAnalysis(
-    X, Z, k, W, max_iterations=250, stop=True, epsilon=1e-3, M=1000.0, verbose=False
+    X,
+    Z,
+    k,
+    W,
+    max_iterations=250,
+    stop=True,
+    epsilon=1e-3,
+    M=1000.0,
+    verbose=False,
+    solver="nnls",
+    warm_start=False,
+    n_jobs=None,
+    candidates=None,
+    telemetry=None,
+    extrapolate=False,
+    A_init=None,
+    B_init=None,
+    X_norm2=None,
 ):
     # initialization
+    if telemetry is None:
+        telemetry = no_telemetry
+    # extrapolate the archetypes between iterations, see _Extrapolation
+    extrapolation = _Extrapolation() if extrapolate else None
+    X = _dense(X)  # the B-step works on all of X^t, scipy.sparse is densified
     n = X.shape[0]
-    A = np.zeros((n, k))  # convex combination for each data point xi, i=1..n
-    B = np.zeros((k, n))  # convex combination for each archetype  zj, j=1..k
+    # with warm_start, A_init and B_init seed the active sets of the first
+    # iteration, e.g. from a fit with fewer archetypes
+    # convex combination for each data point xi, i=1..n
+    A = np.zeros((n, k)) if A_init is None else A_init
+    # convex combination for each archetype  zj, j=1..k
+    B = np.zeros((k, n)) if B_init is None else B_init
 
     iteration = 0
+    pool = ParallelAStep(X, k, n_jobs) if effective_n_jobs(n_jobs) > 1 else None
+    if X_norm2 is None:
+        X_norm2 = _norm2(X)  # for RSS_Z
+    if candidates is not None and np.isscalar(candidates):
+        # size of the pruned candidate set for the B-step
+        n_residual = max(int(candidates) // 10, 1)
+        candidates = boundary_candidates(X, int(candidates))
+    elif candidates is not None:
+        n_residual = max(len(candidates) // 10, 1)
+    # X is fixed, so is its weighted version; diagonal weights
+    # (the only ones coresets produce) are applied by row scaling
+    w = _diagonal(W)
+    if w is not None:
+        wX = w.astype(X.dtype)[:, None] * X
+    else:
+        wX = W.dot(X)
+
     rss = [-999]
 
-    Q = np.vstack((X.T, M * np.ones(n)))
     for iteration in tqdm(range(1, max_iterations + 1), desc="AA"):
         # optimization of all ai's,
         # i.e. the convex combination for each data point xi
-        A = ArchetypalAnalysis_compute_A(X, Z, M)
+        # (if warm, start from the supports of the previous iteration)
+        with telemetry.phase("A"):
+            A, iter_A = _compute_A(X, Z, M, solver, A if warm_start else None, pool)
 
         # update (intermediate) archetypes
         # X = A Z
         # A^t X = A^t A Z
         # ( A^t A )^-1 A^t X = Z
         # Z = np.linalg.solve( np.dot( A.T, A ), np.dot( A.T, X ) )
-        wA = np.dot(W, A)
-        wX = np.dot(W, X)
-        Z = np.linalg.lstsq(np.dot(wA.T, wA), np.dot(wA.T, wX), rcond=None)[0]
+        with telemetry.phase("Z"):
+            if w is not None:
+                wA = w.astype(A.dtype)[:, None] * A
+            else:
+                wA = W.dot(A)
+            Z = np.linalg.lstsq(_dot_T(wA, wA), _dot_T(wA, wX), rcond=None)[0]
         # Z = np.linalg.lstsq(np.dot(wA.T, wA), np.dot(wA.T, wX))[0]
         # Z = np.dot( np.dot( np.linalg.inv( np.dot( A.T, A ) ), A.T ), X )
 
         # optimization of all bj's,
         # i.e., the convex combination for each archetype zj
-        for j in range(k):
-            b, rnorm = nnls(Q, np.hstack((Z[j], M)))
-            B[j] = b.T
-
-        # update archetypes
-        Z = np.dot(B, X)
+        with telemetry.phase("B"):
+            B, iter_B = ArchetypalAnalysis_compute_B(
+                X,
+                Z,
+                M,
+                B_init=B if warm_start else None,
+                return_iterations=True,
+                candidates=candidates,
+                solver=_B_solver(solver),
+            )
+
+            # update archetypes
+            Z = _dot_T(B.T, X)
 
         # compute new RSS and store it
-        rss.append(RSS_Z(X, A, Z))
+        with telemetry.phase("RSS"):
+            rss.append(RSS_Z(X, A, Z, X_norm2))
+
+        if candidates is not None:
+            with telemetry.phase("candidates"):
+                candidates = _update_candidates(candidates, X, A, B, Z, n_residual)
+        telemetry.iteration(
+            iteration,
+            rss[-1],
+            _counted(iter_A, solver, warm_start),
+            _counted(iter_B, _B_solver(solver), warm_start),
+        )
 
         if verbose:
             print("Iteration %2d // RSS=%.3f" % (iteration, rss[-1]))
 
+        if extrapolation is not None:
+            # whether this iteration started from extrapolated archetypes
+            extrapolated = extrapolation.extrapolated
+            Z, accepted = extrapolation.step(Z, B, rss[-1])
+            if not accepted:
+                # go on from the archetypes of the last accepted iteration,
+                # unless a plain iteration from them already increased RSS
+                rss.pop()
+                if stop and not extrapolated:
+                    break
+                continue
+        if verbose and warm_start and solver != "simplex":
+            _print_warm_start_iterations(iter_A, iter_B)
+
         # stop conditions
         converged = np.abs(rss[-1] - rss[-2]) / np.abs(rss[-1]) < epsilon
         increasing = rss[-1] > rss[-2] and len(rss) > 2
@@ -154,12 +535,96 @@ def weightedArchetypalAnalysis(
         if stop and (converged or increasing or outOfIter):
             break
 
-    A = ArchetypalAnalysis_compute_A(X, Z, M)
+    if extrapolation is not None:
+        Z, B = extrapolation.Z, extrapolation.B
+    with telemetry.phase("A"):
+        A = _compute_A(X, Z, M, solver, None, pool)[0]
+    if pool is not None:
+        pool.close()
+    telemetry.finish(rss=rss[-1])
 
     return Z, A, B, rss[1:]
 
 
-def FurthestSum(X, k):
+# extrapolation of the archetypes between outer iterations, after Ang and
+# Gillis (2019), Accelerating Nonnegative Matrix Factorization Algorithms
+# Using Extrapolation: the next A-step gets Z + beta (Z - Z_prev); beta
+# grows while the RSS decreases, an increase undoes the step, shrinks beta
+# and its upper bound, and continues with a plain iteration
+class _Extrapolation:
+    def __init__(self, beta=0.5, gamma=1.05, eta=1.5):
+        self.beta = beta
+        self.beta_max = 1.0
+        self.gamma = gamma
+        self.eta = eta
+        self.Z = None  # archetypes of the last accepted iteration
+        self.B = None
+        self.rss = np.inf
+        self.extrapolated = False  # whether the last Z handed out was
+
+    # Z for the next A-step, and whether Z, B were accepted
+    def step(self, Z, B, rss):
+        if rss > self.rss:
+            if self.extrapolated:
+                self.beta_max = self.beta
+                self.beta = self.beta / self.eta
+            self.extrapolated = False
+            return self.Z, False
+        Z_next = Z
+        self.extrapolated = self.Z is not None
+        if self.extrapolated:
+            Z_next = Z + self.beta * (Z - self.Z)
+            self.beta = min(self.beta_max, self.gamma * self.beta)
+        self.Z, self.B, self.rss = Z, B, rss
+        return Z_next, True
+
+
+# the diagonal of W if W is diagonal, None otherwise; W may be a vector
+# holding the diagonal, a dense matrix or a scipy.sparse matrix
+def _diagonal(W):
+    if sp.issparse(W):
+        d = W.diagonal()
+        return d if W.count_nonzero() == np.count_nonzero(d) else None
+    W = np.asarray(W)
+    if W.ndim == 1:
+        return W
+    d = np.diag(W)
+    return d if np.count_nonzero(W) == np.count_nonzero(d) else None
+
+
+def _dense(X):
+    return X.toarray() if sp.issparse(X) else X
+
+
+# A-step of the AA loops, either in-process or on their process pool
+def _compute_A(X, Z, M, solver, A_init, pool):
+    if pool is not None:
+        return pool.compute_A(Z, M, solver, A_init=A_init)
+    return ArchetypalAnalysis_compute_A(
+        X, Z, M, solver, A_init=A_init, return_iterations=True
+    )
+
+
+# the B-step solves column by column with Lawson-Hanson for the NNLS solvers
+def _B_solver(solver):
+    return "simplex" if solver == "simplex" else "nnls"
+
+
+# solver iterations as returned with return_iterations=True if they were
+# counted, None otherwise: the NNLS solvers only count warm starts, while
+# cold solves with scipy's nnls return zeros
+def _counted(iterations, solver, warm):
+    return iterations if warm or solver in ("batch", "simplex") else None
+
+
+# solver iterations of the warm-started A- and B-step, incl. the shrink steps
+def _print_warm_start_iterations(iter_A, iter_B):
+    print("NNLS iterations: A-step %d, B-step %d" % (iter_A.sum(), iter_B.sum()))
+
+
+# Z continues the selection from given archetypes: k further points are
+# picked, furthest from the rows of Z
+def FurthestSum(X, k, Z=None):
     # Archetypal Analysis for Machine Learning
     # Morten Mørup and Lars Kai Hansen, 2010
 
@@ -172,30 +637,37 @@ def FurthestSum(X, k):
         print("FurthestSum() tries to select as much points as we have")
         return range(n)
 
-    # first item is chosen randomly (uniform distribution)
-    l = np.random.choice(n, size=1, replace=False)[0]
-    # l = 0 # does not matter
-    # compute distances to all other points
-    d = np.linalg.norm(X[l] - X, axis=1)  # <-  norm instead of dist
-    # pick index of furthest point
-    l = d.argmax()
-    # compute distances to all other points
-    d = np.linalg.norm(X[l] - X, axis=1)
-    # pick index of furthest point
-    i = d.argmax()
-    # create pool
-    pool = list(range(n))
-    pool.remove(i)
-    # index of furthest point is chosen first
-    chosen = [i]
+    # points that can still be chosen
+    pool = np.ones(n, dtype=bool)
+    chosen = []
+    if Z is not None:
+        # running sum of distances to all given archetypes
+        d = np.zeros(n)
+        for z in Z:
+            d += np.linalg.norm(X - z, axis=1)
+        k += 1  # all k points are chosen in the loop below
+    else:
+        # first item is chosen randomly (uniform distribution)
+        l = np.random.choice(n, size=1, replace=False)[0]
+        # l = 0 # does not matter
+        # compute distances to all other points
+        d = np.linalg.norm(X[l] - X, axis=1)  # <-  norm instead of dist
+        # pick index of furthest point
+        l = d.argmax()
+        # compute distances to all other points
+        d = np.linalg.norm(X[l] - X, axis=1)
+        # pick index of furthest point
+        i = d.argmax()
+        pool[i] = False
+        # index of furthest point is chosen first
+        chosen = [i]
+        # running sum of distances to all chosen points
+        d = np.linalg.norm(X - X[i], axis=1)
     # add k-1 more indices
     for iteration in range(k - 1):
-        d = []
-        for j in pool:
-            # compute sum of distances to all chosen points
-            d.append(np.linalg.norm(X[chosen] - X[j], axis=1).sum())
         # pick index of furthest point
-        i = pool[np.array(d).argmax()]
-        pool.remove(i)
-        chosen.append(i)
+        i = np.where(pool, d, -np.inf).argmax()
+        pool[i] = False
+        chosen.append(int(i))
+        d += np.linalg.norm(X - X[i], axis=1)
     return chosen
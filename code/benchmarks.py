@@ -0,0 +1,956 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+from time import time
+from evaluation import SampledRSS
+from experiment_settings import M as coreset_sizes
+
+from coresets import *
+from archetypalanalysis import *
+from online import onlineArchetypalAnalysis
+from telemetry import Telemetry
+from restarts import multistartArchetypalAnalysis
+from kpath import kpathArchetypalAnalysis
+from progressive import progressiveArchetypalAnalysis
+
+
+# random data with some spread and k archetypes taken from the data
+def random_problem(n, d, k, seed=0):
+    rng = np.random.RandomState(seed)
+    X = rng.randn(n, d)
+    Z = X[rng.choice(n, k, replace=False)].copy()
+    return X, Z
+
+
+# per-row NNLS loop vs. batched Gram-form NNLS for the A-step
+def benchmark_compute_A(n=5000, d=22, k=25, tol=1e-6):
+    X, Z = random_problem(n, d, k)
+
+    t_start = time()
+    A_loop = ArchetypalAnalysis_compute_A(X, Z, solver="nnls")
+    time_loop = time() - t_start
+
+    t_start = time()
+    A_batch = ArchetypalAnalysis_compute_A(X, Z, solver="batch")
+    time_batch = time() - t_start
+
+    max_diff = np.abs(A_loop - A_batch).max()
+    print(
+        "compute_A n={} d={} k={}: loop {:.2f}s, batch {:.2f}s, speedup {:.1f}x, max|dA|={:.2e}".format(
+            n, d, k, time_loop, time_batch, time_loop / time_batch, max_diff
+        )
+    )
+    assert max_diff < tol, "batched A differs from per-row A"
+    return time_loop, time_batch
+
+
+# cold vs. warm-started active sets in a late AA iteration, where Z moves little
+def benchmark_warm_start(n=5000, d=22, k=25):
+    X, Z_init = random_problem(n, d, k)
+    Z, A, B, rss = ArchetypalAnalysis(X, Z_init, k, solver="batch", max_iterations=10)
+    Z_next = Z + 1e-3 * np.random.RandomState(1).randn(*Z.shape)
+
+    t_start = time()
+    A_cold, iter_cold = ArchetypalAnalysis_compute_A(
+        X, Z_next, solver="batch", A_init=np.zeros_like(A), return_iterations=True
+    )
+    time_cold = time() - t_start
+    t_start = time()
+    A_warm, iter_warm = ArchetypalAnalysis_compute_A(
+        X, Z_next, solver="batch", A_init=A, return_iterations=True
+    )
+    time_warm = time() - t_start
+    print(
+        "warm A-step n={} k={}: cold {} iter {:.2f}s, warm {} iter {:.2f}s, max|dA|={:.2e}".format(
+            n,
+            k,
+            iter_cold.sum(),
+            time_cold,
+            iter_warm.sum(),
+            time_warm,
+            np.abs(A_cold - A_warm).max(),
+        )
+    )
+
+    t_start = time()
+    B_cold, iter_cold = ArchetypalAnalysis_compute_B(
+        X, Z_next, B_init=np.zeros_like(B), return_iterations=True
+    )
+    time_cold = time() - t_start
+    t_start = time()
+    B_warm, iter_warm = ArchetypalAnalysis_compute_B(
+        X, Z_next, B_init=B, return_iterations=True
+    )
+    time_warm = time() - t_start
+    print(
+        "warm B-step n={} k={}: cold {} iter {:.2f}s, warm {} iter {:.2f}s, max|dB|={:.2e}".format(
+            n,
+            k,
+            iter_cold.sum(),
+            time_cold,
+            iter_warm.sum(),
+            time_warm,
+            np.abs(B_cold - B_warm).max(),
+        )
+    )
+
+
+# A-step on a process pool for 1..cpu_count() workers
+def benchmark_n_jobs(n=20000, d=22, k=25, solver="nnls"):
+    X, Z = random_problem(n, d, k)
+    A_serial = None
+    for n_jobs in range(1, os.cpu_count() + 1):
+        t_start = time()
+        A = ArchetypalAnalysis_compute_A(X, Z, solver=solver, n_jobs=n_jobs)
+        runtime = time() - t_start
+        if A_serial is None:
+            A_serial, time_serial = A, runtime
+        print(
+            "compute_A n={} k={} n_jobs={}: {:.2f}s, speedup {:.1f}x, max|dA|={:.2e}".format(
+                n, k, n_jobs, runtime, time_serial / runtime, np.abs(A - A_serial).max()
+            )
+        )
+
+
+# mixtures of a few vertices plus noise, i.e. data with a well defined hull
+def mixture_problem(n, d, k, seed=0, noise=0.1):
+    rng = np.random.RandomState(seed)
+    V = 3 * rng.randn(k, d)
+    X = np.dot(rng.dirichlet(0.5 * np.ones(k), n), V) + noise * rng.randn(n, d)
+    Z = X[rng.choice(n, k, replace=False)].copy()
+    return X, Z
+
+
+# full B-step vs. B-step restricted to boundary candidates
+def benchmark_candidates(n=20000, d=15, k=10, size=500, max_iterations=8):
+    X, Z_init = mixture_problem(n, d, k)
+
+    t_start = time()
+    Z, A, B, rss_full = ArchetypalAnalysis(
+        X, Z_init, k, max_iterations=max_iterations, solver="batch"
+    )
+    time_full = time() - t_start
+    t_start = time()
+    Z, A, B, rss_pruned = ArchetypalAnalysis(
+        X, Z_init, k, max_iterations=max_iterations, solver="batch", candidates=size
+    )
+    time_pruned = time() - t_start
+    print(
+        "candidates n={} k={} size={}: full {:.2f}s, pruned {:.2f}s, max rel. RSS diff {:.2e}".format(
+            n,
+            k,
+            size,
+            time_full,
+            time_pruned,
+            np.max(np.abs(np.array(rss_pruned) / np.array(rss_full) - 1)),
+        )
+    )
+
+
+# weighted Z update with a dense diagonal W vs. row scaling by its diagonal
+def benchmark_weights(sizes=coreset_sizes, d=54, k=25, repeats=3):
+    for m in sizes:
+        rng = np.random.RandomState(0)
+        X = rng.randn(m, d)
+        A = rng.dirichlet(np.ones(k), m)
+        w = np.sqrt(rng.rand(m) * m)
+
+        t_start = time()
+        for _ in range(repeats):
+            W = np.diag(w)
+            wA = np.dot(W, A)
+            wX = np.dot(W, X)
+            Z_dense = np.linalg.lstsq(np.dot(wA.T, wA), np.dot(wA.T, wX), rcond=None)[0]
+        time_dense = (time() - t_start) / repeats
+        mem_dense = W.nbytes
+        del W
+
+        t_start = time()
+        for _ in range(repeats):
+            wA = w[:, None] * A
+            wX = w[:, None] * X
+            Z_diag = np.linalg.lstsq(np.dot(wA.T, wA), np.dot(wA.T, wX), rcond=None)[0]
+        time_diag = (time() - t_start) / repeats
+        print(
+            "weights m={}: dense W {:.1f}MB {:.3f}s, diagonal {:.3f}MB {:.4f}s, max|dZ|={:.2e}".format(
+                m,
+                mem_dense / 2 ** 20,
+                time_dense,
+                w.nbytes / 2 ** 20,
+                time_diag,
+                np.abs(Z_dense - Z_diag).max(),
+            )
+        )
+
+
+# FurthestSum initialisation, O(nk) distance computations
+def benchmark_furthest_sum(n=100000, d=90, k=100):
+    X = np.random.RandomState(0).randn(n, d)
+    t_start = time()
+    FurthestSum(X, k)
+    print("FurthestSum n={} d={} k={}: {:.2f}s".format(n, d, k, time() - t_start))
+
+
+# previous lucic_coreset(): all distances every round and an O(n^2) loop
+# over the points for the sensitivities; kept as reference
+def _lucic_coreset_reference(X, m, k):
+    n = X.shape[0]
+    i = np.random.choice(n, 1)
+    B = X[i]
+    for _ in range(k - 1):
+        dist = np.array(list(map(lambda b: np.sum((X - b) ** 2, axis=1), B)))
+        closest_cluster_id = dist.argmin(0)
+        dist = dist[closest_cluster_id, np.arange(n)]
+        p = dist / dist.sum()
+        i = np.random.choice(n, 1, replace=False, p=p)[0]
+        B = np.vstack((B, X[i]))
+    a = 16 * (np.log(k) + 2)
+    dist = np.array(list(map(lambda b: np.sum((X - b) ** 2, axis=1), B)))
+    closest_cluster_id = dist.argmin(0)
+    dist = dist[closest_cluster_id, np.arange(n)]
+    c = dist.mean()
+    s = np.zeros(n)
+    for i in range(n):
+        Bi_cardinality = np.sum(closest_cluster_id == closest_cluster_id[i])
+        tmp = dist[closest_cluster_id == closest_cluster_id[i]].sum()
+        s[i] = (
+            a * dist[i] / c
+            + 2 * a * tmp / (Bi_cardinality * c)
+            + 4 * n / Bi_cardinality
+        )
+    p = s / s.sum()
+    ind = np.random.choice(n, m, p=p)
+    return X[ind], 1 / (m * p[ind])
+
+
+def benchmark_lucic(n=20000, d=22, k=25, m=1000):
+    X = np.random.RandomState(0).randn(n, d)
+
+    np.random.seed(1)
+    t_start = time()
+    X_ref, w_ref = _lucic_coreset_reference(X, m, k)
+    time_ref = time() - t_start
+    np.random.seed(1)
+    t_start = time()
+    X_C, w_C = lucic_coreset(X, m, k)
+    time_new = time() - t_start
+    print(
+        "lucic_coreset n={} k={} m={}: reference {:.2f}s, vectorized {:.3f}s, same sample: {}, max rel. weight diff {:.2e}".format(
+            n,
+            k,
+            m,
+            time_ref,
+            time_new,
+            np.array_equal(X_ref, X_C),
+            np.abs(w_C / w_ref - 1).max(),
+        )
+    )
+
+
+# in-memory abs-cs vs. two passes over a memory-mapped .npy file
+def benchmark_coreset_stream(n=500000, d=90, m=8000, chunk_size=65536):
+    path = os.path.join(tempfile.mkdtemp(), "X.npy")
+    X = np.lib.format.open_memmap(path, mode="w+", shape=(n, d))
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        X[start:stop] = np.random.RandomState(start).randn(stop - start, d)
+    X.flush()
+    del X
+
+    X = np.load(path)
+    np.random.seed(0)
+    tracemalloc.start()
+    t_start = time()
+    X_C, w_C = coreset(X, m)
+    time_mem = time() - t_start
+    peak_mem = tracemalloc.get_traced_memory()[1] + X.nbytes
+    tracemalloc.stop()
+    del X
+
+    np.random.seed(0)
+    tracemalloc.start()
+    t_start = time()
+    X_S, w_S = coreset_stream(path, m, chunk_size)
+    time_stream = time() - t_start
+    peak_stream = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    os.remove(path)
+    print(
+        "coreset n={} d={} m={}: in memory {:.2f}s {:.0f}MB, streamed {:.2f}s {:.0f}MB, same sample: {}".format(
+            n,
+            d,
+            m,
+            time_mem,
+            peak_mem / 2 ** 20,
+            time_stream,
+            peak_stream / 2 ** 20,
+            np.array_equal(X_C, X_S),
+        )
+    )
+
+
+# full-data RSS of weighted AA on a merge-and-reduce coreset vs. on a
+# batch coreset of the same size, both relative to AA on all data
+def benchmark_streaming_coreset(
+    n=100000, d=15, k=10, m=1000, batch=5000, repetitions=5, tol=0.05
+):
+    X, Z_init = mixture_problem(n, d, k, noise=1.0)
+    Z, A, B, rss = ArchetypalAnalysis(X, Z_init, k, solver="batch")
+    rss_full = RSS_Z(X, A, Z)
+
+    def fit(X_C, w_C):
+        Z_init = X_C[FurthestSum(X_C, k)].copy()
+        Z, A, B, rss = weightedArchetypalAnalysis(
+            X_C, Z_init, k, np.sqrt(w_C), solver="batch"
+        )
+        A = ArchetypalAnalysis_compute_A(X, Z, solver="batch")
+        return RSS_Z(X, A, Z)
+
+    err_batch = []
+    err_stream = []
+    time_append = 0.0
+    for i in range(repetitions):
+        np.random.seed(i)
+        err_batch.append(fit(*coreset(X, m)) / rss_full - 1)
+        t_start = time()
+        S = StreamingCoreset(m)
+        for start in range(0, n, batch):
+            S.append(X[start : start + batch])
+        time_append += time() - t_start
+        err_stream.append(fit(*S.coreset(m)) / rss_full - 1)
+    print(
+        "streaming coreset n={} m={}: rel. error batch {:.4f}, streamed {:.4f}, append {:.2f}us/row".format(
+            n,
+            m,
+            np.mean(err_batch),
+            np.mean(err_stream),
+            1e6 * time_append / (repetitions * n),
+        )
+    )
+    assert np.mean(err_stream) < np.mean(err_batch) + tol
+
+
+# sampled full-data RSS vs. exact RSS for random archetypes: error,
+# coverage of the confidence intervals and time per evaluation
+def benchmark_sampled_evaluation(n=200000, d=15, k=10, size=5000, trials=20):
+    X, Z = mixture_problem(n, d, k, noise=1.0)
+    t_start = time()
+    evaluation = SampledRSS(X, size=size)
+    time_setup = time() - t_start
+    rng = np.random.RandomState(1)
+    err, covered, time_est, time_exact = [], 0, 0.0, 0.0
+    for _ in range(trials):
+        Z = X[rng.choice(n, k, replace=False)]
+        t_start = time()
+        rss, ci = evaluation.estimate(Z)
+        time_est += time() - t_start
+        t_start = time()
+        rss_exact = RSS_Z(X, ArchetypalAnalysis_compute_A(X, Z, solver="batch"), Z)
+        time_exact += time() - t_start
+        err.append(np.abs(rss / rss_exact - 1))
+        covered += ci[0] <= rss_exact <= ci[1]
+    print(
+        "sampled RSS n={} size={}: set-up {:.2f}s, {:.3f}s vs. exact {:.3f}s, mean rel. error {:.4f}, CI coverage {}/{}".format(
+            n,
+            size,
+            time_setup,
+            time_est / trials,
+            time_exact / trials,
+            np.mean(err),
+            covered,
+            trials,
+        )
+    )
+
+
+# previous RSS_Z(): two n x d temporaries
+def _RSS_Z_reference(X, A, Z):
+    tmp = X - np.dot(A, Z)
+    return np.sum(tmp ** 2)
+
+
+def benchmark_rss(n=500000, d=90, k=25, repeats=3):
+    X, Z = random_problem(n, d, k)
+    A = np.random.RandomState(1).dirichlet(np.ones(k), n)
+    results = []
+    for name, f in [
+        ("reference", lambda: _RSS_Z_reference(X, A, Z)),
+        ("Gram", lambda: RSS_Z(X, A, Z)),
+        ("Gram, cached ||X||", lambda X_norm2=np.sum(X ** 2): RSS_Z(X, A, Z, X_norm2)),
+        ("blocks", lambda: RSS_Z(X, A, Z, rtol=0.0)),
+    ]:
+        tracemalloc.start()
+        t_start = time()
+        for _ in range(repeats):
+            rss = f()
+        runtime = (time() - t_start) / repeats
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append(rss)
+        print(
+            "RSS_Z n={} d={} k={} {}: {:.3f}s, peak {:.1f}MB, rel. diff {:.2e}".format(
+                n, d, k, name, runtime, peak / 2 ** 20, rss / results[0] - 1
+            )
+        )
+    assert np.allclose(results, results[0], rtol=1e-8)
+
+
+# repeated coreset() calls vs. draws from a SamplingIndex
+def benchmark_sampling_index(n=500000, d=90, sizes=coreset_sizes, repetitions=10):
+    X = np.random.RandomState(0).randn(n, d)
+    t_start = time()
+    for m in sizes:
+        for rep in range(repetitions):
+            np.random.seed(rep)
+            coreset(X, m)
+    time_coreset = time() - t_start
+    t_start = time()
+    index = SamplingIndex(X, "abs-cs")
+    time_index = time() - t_start
+    t_start = time()
+    for m in sizes:
+        for rep in range(repetitions):
+            index.draw(X, m, rep)
+    time_draw = time() - t_start
+    print(
+        "sampling index n={} draws={}: coreset() {:.2f}s, index set-up {:.2f}s + draws {:.3f}s".format(
+            n, len(sizes) * repetitions, time_coreset, time_index, time_draw
+        )
+    )
+
+
+# penalized NNLS vs. the simplex solver: A-step time, RSS and violation of
+# sum(ai) = 1, B-step time and objective, then the iterations and time of
+# full AA runs; on Gaussian data and on mixtures with a well defined hull
+def benchmark_simplex(n=5000, d=22, k=25, max_iterations=50):
+    for name, problem in [("random", random_problem), ("mixture", mixture_problem)]:
+        X, Z_init = problem(n, d, k)
+        for solver in ["nnls", "batch", "simplex"]:
+            t_start = time()
+            A = ArchetypalAnalysis_compute_A(X, Z_init, solver=solver)
+            print(
+                "{} A-step {} n={} k={}: {:.2f}s, RSS={:.6e}, max|sum(ai)-1|={:.1e}".format(
+                    name,
+                    solver,
+                    n,
+                    k,
+                    time() - t_start,
+                    RSS_Z(X, A, Z_init),
+                    np.abs(A.sum(axis=1) - 1).max(),
+                )
+            )
+        # archetypes away from the data, so that the B-step has work to do
+        Z = Z_init + np.random.RandomState(1).randn(k, d)
+        for solver in ["nnls", "simplex"]:
+            t_start = time()
+            B = ArchetypalAnalysis_compute_B(X, Z, solver=solver)
+            print(
+                "{} B-step {} n={} k={}: {:.2f}s, ||BX - Z||^2={:.6e}, "
+                "max|sum(bj)-1|={:.1e}".format(
+                    name,
+                    solver,
+                    n,
+                    k,
+                    time() - t_start,
+                    np.sum((np.dot(B, X) - Z) ** 2),
+                    np.abs(B.sum(axis=1) - 1).max(),
+                )
+            )
+        for solver in ["batch", "simplex"]:
+            t_start = time()
+            Z, A, B, rss = ArchetypalAnalysis(
+                X,
+                Z_init,
+                k,
+                solver=solver,
+                warm_start=True,
+                max_iterations=max_iterations,
+            )
+            print(
+                "{} AA {} n={} k={}: {} iterations, {:.2f}s, RSS={:.6e}".format(
+                    name, solver, n, k, len(rss), time() - t_start, rss[-1]
+                )
+            )
+
+
+# online AA from a memory-mapped .npy file vs. AA on all data (with a
+# pruned B-step), both from the same FurthestSum initialization
+def benchmark_online(n=100000, d=15, k=10, batch_size=1024, candidates=2000):
+    X, _ = mixture_problem(n, d, k)
+    np.random.seed(0)
+    Z_init = X[FurthestSum(X, k)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "X.npy")
+        np.save(path, X)
+        t_start = time()
+        Z, B, X_C, rss = onlineArchetypalAnalysis(
+            path, Z_init, k, batch_size=batch_size, candidates=candidates
+        )
+        time_online = time() - t_start
+    A = ArchetypalAnalysis_compute_A(X, Z, solver="batch")
+    rss_online = RSS_Z(X, A, Z)
+    t_start = time()
+    Z, A, B, rss = ArchetypalAnalysis(
+        X, Z_init, k, solver="batch", candidates=candidates
+    )
+    time_full = time() - t_start
+    print(
+        "online AA n={} k={}: {:.2f}s, RSS={:.6e}; AA {} iterations {:.2f}s, RSS={:.6e}".format(
+            n, k, time_online, rss_online, len(rss), time_full, RSS_Z(X, A, Z)
+        )
+    )
+
+
+# overhead of the telemetry hook: AA without it, with it and with memory
+# tracing, and the split of the time into phases
+def benchmark_telemetry(n=5000, d=22, k=25, repeats=3):
+    X, Z_init = random_problem(n, d, k)
+    for name, make in [
+        ("off", lambda: None),
+        ("on", lambda: Telemetry()),
+        ("trace_memory", lambda: Telemetry(trace_memory=True)),
+    ]:
+        times = []
+        for r in range(repeats):
+            telemetry = make()
+            t_start = time()
+            ArchetypalAnalysis(X, Z_init, k, solver="batch", telemetry=telemetry)
+            times.append(time() - t_start)
+        print("telemetry {} n={} k={}: {:.3f}s".format(name, n, k, min(times)))
+    phases = telemetry.summary()["time"]
+    print(
+        "phases: "
+        + ", ".join("{} {:.3f}s".format(name, t) for name, t in phases.items())
+    )
+
+
+# shapes of the four data sets of the experiments
+dataset_shapes = {
+    "ijcnn1": (49990, 22),
+    "pose": (35832, 48),
+    "song": (515345, 90),
+    "covertype": (581012, 54),
+}
+
+
+# synthetic stand-in for one of the data sets: points in the convex hull of
+# k known archetypes V plus Gaussian noise; scale < 1 shrinks n for quick runs
+def synthetic_dataset(dataset, k=25, scale=1.0, noise=0.1, seed=0):
+    n, d = dataset_shapes[dataset]
+    n = max(int(n * scale), 10 * k)
+    rng = np.random.RandomState(seed)
+    V = 3 * rng.randn(k, d)
+    X = np.dot(rng.dirichlet(0.5 * np.ones(k), n), V) + noise * rng.randn(n, d)
+    return X, V
+
+
+# minimum wall time of repeats calls and the result of the last one
+def _timed(f, repeats=1):
+    times = []
+    for r in range(repeats):
+        t_start = time()
+        result = f()
+        times.append(time() - t_start)
+    return min(times), result
+
+
+# times every hot path on the synthetic data sets and returns the results
+# as a list of records; with a path they are saved there as JSON together
+# with the commit and the machine, see compare_baselines
+def benchmark_suite(
+    datasets=list(dataset_shapes),
+    k=25,
+    m=1000,
+    scale=1.0,
+    repeats=1,
+    solver="batch",
+    path=None,
+):
+    records = []
+
+    def record(dataset, X, name, t, **info):
+        r = dict(dataset=dataset, n=X.shape[0], d=X.shape[1], k=k, m=m, name=name)
+        r.update(time=t, **info)
+        records.append(r)
+        print("{} n={} d={} {}: {:.3f}s".format(dataset, r["n"], r["d"], name, t))
+
+    for dataset in datasets:
+        X, V = synthetic_dataset(dataset, k, scale)
+        np.random.seed(0)
+        samples = {}
+        for name, sampler in [
+            ("uniform_sample", lambda: (uniform_sample(X, m), None)),
+            ("lightweight_coreset", lambda: lightweight_coreset(X, m)),
+            ("coreset", lambda: coreset(X, m)),
+            ("lucic_coreset", lambda: lucic_coreset(X, m, k)),
+        ]:
+            t, samples[name] = _timed(sampler, repeats)
+            record(dataset, X, name, t)
+        t, ind = _timed(lambda: FurthestSum(X, k), repeats)
+        record(dataset, X, "FurthestSum", t)
+        Z = X[ind]
+        t, A = _timed(
+            lambda: ArchetypalAnalysis_compute_A(X, Z, solver=solver), repeats
+        )
+        record(dataset, X, "compute_A", t, solver=solver)
+        t, rss = _timed(lambda: RSS_Z(X, A, Z), repeats)
+        record(dataset, X, "RSS_Z", t, rss=float(rss))
+        # error of the true archetypes, for reference
+        A_true = ArchetypalAnalysis_compute_A(X, V, solver=solver)
+        rss_true = RSS_Z(X, A_true, V)
+
+        # the B-step and AA run on the abs-cs coreset, as in the experiments
+        X_C, w_C = samples["coreset"]
+        Z_init = X_C[FurthestSum(X_C, k)]
+        t, B = _timed(lambda: ArchetypalAnalysis_compute_B(X_C, Z_init), repeats)
+        record(dataset, X, "compute_B", t)
+        t, (Z, A, B, rss) = _timed(
+            lambda: ArchetypalAnalysis(X_C, Z_init, k, solver=solver), repeats
+        )
+        record(dataset, X, "ArchetypalAnalysis", t, iterations=len(rss))
+        W = np.sqrt(w_C)
+        t, (Z, A, B, rss) = _timed(
+            lambda: weightedArchetypalAnalysis(X_C, Z_init, k, W, solver=solver),
+            repeats,
+        )
+        A = ArchetypalAnalysis_compute_A(X, Z, solver=solver)
+        record(
+            dataset,
+            X,
+            "weightedArchetypalAnalysis",
+            t,
+            iterations=len(rss),
+            rss=float(RSS_Z(X, A, Z)),
+            rss_true=float(rss_true),
+        )
+
+    if path is not None:
+        baseline = {
+            "commit": _git_commit(),
+            "machine": platform.platform(),
+            "cpus": os.cpu_count(),
+            "numpy": np.__version__,
+            "scale": scale,
+            "results": records,
+        }
+        with open(path, "w") as fp:
+            json.dump(baseline, fp, indent=1)
+    return records
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ratio of the times of two baselines of benchmark_suite for every timing
+# they have in common; ratios above threshold are flagged as regressions
+# unless the difference is below min_time seconds
+def compare_baselines(old, new, threshold=1.2, min_time=0.01):
+    with open(old) as fp:
+        old = json.load(fp)
+    with open(new) as fp:
+        new = json.load(fp)
+
+    def key(r):
+        return (r["dataset"], r["n"], r["d"], r["k"], r["m"], r["name"])
+
+    times = {key(r): r["time"] for r in old["results"]}
+    regressions = 0
+    for r in new["results"]:
+        if key(r) not in times:
+            continue
+        ratio = r["time"] / max(times[key(r)], 1e-9)
+        slower = ratio > threshold and r["time"] - times[key(r)] > min_time
+        flag = " <- regression" if slower else ""
+        regressions += slower
+        print(
+            "{} {}: {:.3f}s -> {:.3f}s ({:.2f}x){}".format(
+                r["dataset"], r["name"], times[key(r)], r["time"], ratio, flag
+            )
+        )
+    return regressions
+
+
+# plain vs. extrapolated outer iterations of weighted AA on abs-cs coresets
+# of the synthetic data sets; totals over all data sets and seeds, and the
+# number of runs in which extrapolation needed fewer iterations
+def benchmark_extrapolate(
+    datasets=list(dataset_shapes), k=25, m=2000, scale=0.05, seeds=5
+):
+    totals = {False: np.zeros(3), True: np.zeros(3)}
+    fewer = 0
+    for dataset in datasets:
+        for seed in range(seeds):
+            X, V = synthetic_dataset(dataset, k, scale, seed=seed)
+            np.random.seed(seed)
+            X_C, w_C = coreset(X, m)
+            Z_init = X_C[FurthestSum(X_C, k)]
+            W = np.sqrt(w_C)
+            runs = {}
+            for extrapolate in [False, True]:
+                telemetry = Telemetry()
+                t_start = time()
+                Z, A, B, rss = weightedArchetypalAnalysis(
+                    X_C,
+                    Z_init,
+                    k,
+                    W,
+                    epsilon=1e-4,
+                    solver="batch",
+                    extrapolate=extrapolate,
+                    telemetry=telemetry,
+                )
+                t = time() - t_start
+                # iterations including the rejected ones
+                runs[extrapolate] = telemetry.summary()["iterations"]
+                rss = RSS_Z(W[:, None] * X_C, W[:, None] * A, Z)
+                totals[extrapolate] += [runs[extrapolate], t, rss]
+            fewer += runs[True] < runs[False]
+    for extrapolate in [False, True]:
+        print(
+            "AA extrapolate={}: {:.0f} iterations, {:.2f}s, RSS={:.6e}".format(
+                extrapolate, *totals[extrapolate]
+            )
+        )
+    print(
+        "extrapolation needed fewer iterations in {} of {} runs".format(
+            fewer, len(datasets) * seeds
+        )
+    )
+
+
+# restarts of weighted AA on abs-cs coresets, all run to convergence vs.
+# raced by successive halving: total iterations, time and the best RSS
+def benchmark_restarts(
+    datasets=list(dataset_shapes), k=25, m=2000, scale=0.1, restarts=8
+):
+    for dataset in datasets:
+        X, V = synthetic_dataset(dataset, k, scale)
+        np.random.seed(0)
+        X_C, w_C = coreset(X, m)
+        for name, budget in [("all", 250), ("halving", 10)]:
+            t_start = time()
+            Z, A, B, rss, stats = multistartArchetypalAnalysis(
+                X_C, k, restarts, np.sqrt(w_C), budget, solver="batch"
+            )
+            print(
+                "{} restarts={} {}: {} iterations, {:.2f}s, best RSS={:.6e}".format(
+                    dataset,
+                    restarts,
+                    name,
+                    sum(s["iterations"] for s in stats),
+                    time() - t_start,
+                    rss[-1],
+                )
+            )
+
+
+# separate weighted AA fits for a grid of k vs. one warm-started k-path,
+# on abs-cs coresets of the synthetic data sets
+def benchmark_kpath(
+    datasets=list(dataset_shapes),
+    ks=[5, 10, 15, 20, 25, 30, 40, 50],
+    m=2000,
+    scale=0.1,
+):
+    for dataset in datasets:
+        X, V = synthetic_dataset(dataset, max(ks), scale)
+        np.random.seed(0)
+        X_C, w_C = coreset(X, m)
+        W = np.sqrt(w_C)
+        for warm_start in [False, True]:
+            t_start = time()
+            rss = []
+            for k in ks:
+                np.random.seed(0)
+                Z_init = X_C[FurthestSum(X_C, k)]
+                rss.append(
+                    weightedArchetypalAnalysis(
+                        X_C, Z_init, k, W, solver="batch", warm_start=warm_start
+                    )[3][-1]
+                )
+            print(
+                "{} separate fits warm_start={}: {:.2f}s, sum of RSS={:.6e}".format(
+                    dataset, warm_start, time() - t_start, np.sum(rss)
+                )
+            )
+        t_start = time()
+        fits, curve = kpathArchetypalAnalysis(X_C, ks, W, solver="batch")
+        print(
+            "{} k-path: {:.2f}s, sum of RSS={:.6e}".format(
+                dataset, time() - t_start, curve[:, 1].sum()
+            )
+        )
+
+
+# single precision X against float64 at the sizes of the four data sets:
+# archetypes are fit on a coreset in either precision, then the A-step and
+# the RSS on all data; relative errors are against the float64 results
+def benchmark_float32(datasets=list(dataset_shapes), k=25, m=2000, scale=1.0):
+    for dataset in datasets:
+        X, V = synthetic_dataset(dataset, k, scale)
+        result = {}
+        for dtype in [np.float64, np.float32]:
+            X_d = X.astype(dtype)
+            np.random.seed(0)
+            X_C, w_C = coreset(X_d, m)
+            Z_init = X_C[FurthestSum(X_C, k)]
+            t_start = time()
+            Z, A_C, B, rss_C = weightedArchetypalAnalysis(
+                X_C, Z_init, k, np.sqrt(w_C), solver="batch"
+            )
+            t_fit = time() - t_start
+            tracemalloc.start()
+            t_start = time()
+            A = ArchetypalAnalysis_compute_A(X_d, Z, solver="batch")
+            t_A = time() - t_start
+            t_start = time()
+            rss = RSS_Z(X_d, A, Z)
+            t_rss = time() - t_start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            result[dtype] = (Z, A, rss)
+            # the float64 archetypes on the float32 data: the error of the
+            # A-step and RSS alone
+            Z_64, A_64, rss_64 = result[np.float64]
+            A_same = ArchetypalAnalysis_compute_A(X_d, Z_64, solver="batch")
+            rss_same = RSS_Z(X_d, A_same, Z_64)
+            print(
+                "{} {}: fit {:.2f}s ({} iterations), A-step {:.2f}s, RSS {:.3f}s, "
+                "X {:.0f}MB, A {:.0f}MB, peak {:.0f}MB".format(
+                    dataset,
+                    np.dtype(dtype).name,
+                    t_fit,
+                    len(rss_C) - 1,
+                    t_A,
+                    t_rss,
+                    X_d.nbytes / 2.0 ** 20,
+                    A.nbytes / 2.0 ** 20,
+                    peak / 2.0 ** 20,
+                )
+            )
+            print(
+                "    RSS={:.6e}, rel. error {:.1e} (same archetypes {:.1e}, "
+                "max |A - A_64| {:.1e}), archetypes rel. error {:.1e}".format(
+                    rss,
+                    abs(rss - rss_64) / rss_64,
+                    abs(rss_same - rss_64) / rss_64,
+                    np.abs(A_same - A_64).max(),
+                    np.linalg.norm(Z - Z_64) / np.linalg.norm(Z_64),
+                )
+            )
+
+
+# progressive coreset AA against the fixed sizes of the experiments, fitted
+# from scratch each; RSS on all data is estimated on the same evaluation
+# sample for both
+def benchmark_progressive(
+    datasets=list(dataset_shapes), k=25, m0=500, m_max=32000, tol=1e-2, scale=1.0
+):
+    for dataset in datasets:
+        X, V = synthetic_dataset(dataset, k, scale)
+        index = SamplingIndex(X, "abs-cs")
+        evaluation = SampledRSS(X)
+        t_start = time()
+        Z, X_C, w_C, levels = progressiveArchetypalAnalysis(
+            X,
+            k,
+            m0,
+            m_max=m_max,
+            tol=tol,
+            sampler=index,
+            evaluation=evaluation,
+            solver="batch",
+        )
+        print(
+            "{} progressive: {:.2f}s, m={}, RSS={:.6e}".format(
+                dataset, time() - t_start, levels[-1]["m"], levels[-1]["rss"]
+            )
+        )
+        for level in levels:
+            print(
+                "    m={:5d}: {:3d} iterations, {:.2f}s, RSS={:.6e}, change {}".format(
+                    level["m"],
+                    level["iterations"],
+                    level["runtime"],
+                    level["rss"],
+                    "-" if level["change"] is None else "%.1e" % level["change"],
+                )
+            )
+        for m in coreset_sizes:
+            np.random.seed(0)
+            t_start = time()
+            X_C, w_C = index.draw(X, m)
+            Z_init = X_C[FurthestSum(X_C, k)]
+            Z, A, B, rss = weightedArchetypalAnalysis(
+                X_C, Z_init, k, np.sqrt(w_C), solver="batch"
+            )
+            runtime = time() - t_start
+            print(
+                "    fixed m={:5d}: {:3d} iterations, {:.2f}s, RSS={:.6e}".format(
+                    m, len(rss), runtime, evaluation.estimate(Z)[0]
+                )
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--suite", action="store_true", help="time the hot paths on synthetic data"
+    )
+    parser.add_argument("--datasets", nargs="+", default=list(dataset_shapes))
+    parser.add_argument("--scale", type=float, default=1.0, help="fraction of n")
+    parser.add_argument("--k", type=int, default=25)
+    parser.add_argument("--m", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--output", help="save the suite's results as JSON")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two baselines"
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_baselines(*args.compare)
+    elif args.suite:
+        benchmark_suite(
+            args.datasets, args.k, args.m, args.scale, args.repeats, path=args.output
+        )
+    else:
+        benchmark_compute_A(n=5000, d=22, k=25)
+        benchmark_compute_A(n=5000, d=90, k=100)
+        benchmark_warm_start(n=5000, d=22, k=25)
+        benchmark_n_jobs(n=20000, d=22, k=25)
+        benchmark_candidates(n=20000, d=15, k=10, size=500)
+        benchmark_weights()
+        benchmark_furthest_sum(n=100000, d=90, k=100)
+        benchmark_lucic(n=20000, d=22, k=25, m=1000)
+        benchmark_coreset_stream(n=500000, d=90, m=8000)
+        benchmark_streaming_coreset(n=100000, d=15, k=10, m=1000)
+        benchmark_sampled_evaluation(n=200000, d=15, k=10, size=5000)
+        benchmark_rss(n=500000, d=90, k=25)
+        benchmark_sampling_index(n=500000, d=90)
+        benchmark_simplex(n=5000, d=22, k=25)
+        benchmark_simplex(n=5000, d=15, k=10)
+        benchmark_online(n=100000, d=15, k=10)
+        benchmark_telemetry(n=5000, d=22, k=25)
+        benchmark_extrapolate()
+        benchmark_restarts()
+        benchmark_kpath()
+        benchmark_float32()
+        benchmark_progressive()
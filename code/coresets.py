@@ -2,6 +2,34 @@
 # -*- coding: utf-8 -*-
 
 import numpy as np
+import scipy.sparse as sp
+
+
+# squared distances of all rows of X to the point x; for scipy.sparse X via
+# ||xi||^2 - 2 xi^t x + ||x||^2, with the squared row norms X_norm2 if given;
+# the distances are summed in float64 also for float32 X, as they are
+# normalized into sampling probabilities
+def _sq_dist(X, x, X_norm2=None):
+    if not sp.issparse(X):
+        return np.sum((X - np.asarray(x, dtype=X.dtype)) ** 2, axis=1, dtype=float)
+    if X_norm2 is None:
+        X_norm2 = _row_norm2(X)
+    x = np.asarray(x, dtype=float)
+    return np.maximum(X_norm2 - 2 * (X @ x) + np.dot(x, x), 0.0)
+
+
+def _row_norm2(X):
+    if sp.issparse(X):
+        # scipy.sparse multiplies and sums in X.dtype, hence float64 squares
+        return np.asarray(X.multiply(X.astype(float)).sum(axis=1, dtype=float)).ravel()
+    return np.sum(X ** 2, axis=1, dtype=float)
+
+
+def _mean(X):
+    if sp.issparse(X):
+        # scipy.sparse sums in X.dtype whatever the dtype argument
+        return np.asarray(X.T @ np.ones(X.shape[0])).ravel() / X.shape[0]
+    return X.mean(axis=0, dtype=float)
 
 
 # "uniform" in the paper
@@ -17,7 +45,7 @@ def lightweight_coreset(X, m):
     # Scalable k-means clustering via lightweight coresets
     # Bachem et al. (2018)
     n = X.shape[0]
-    dist = np.sum((X - X.mean(axis=0)) ** 2, axis=1)
+    dist = _sq_dist(X, _mean(X))
     q = 0.5 * 1 / n + 0.5 * dist / dist.sum()
     ind = np.random.choice(n, m, p=q)
     X_C = X[ind]
@@ -28,18 +56,29 @@ def lightweight_coreset(X, m):
 # Mahalanobis D^2-sampling
 # needed by lucic_coreset()
 def mahanalobis_d2_sampling(X, k):
+    return _d2_sampling(X, k)[0]
+
+
+# D^2-sampling keeping the distance to the closest center so far,
+# returns the centers, the closest center of each point and its distance
+def _d2_sampling(X, k):
     n = X.shape[0]
+    X_norm2 = _row_norm2(X) if sp.issparse(X) else None
     i = np.random.choice(n, 1)
-    B = X[i]
-    for _ in range(k - 1):
-        # d_A(x,y) = is \|x-y\|_2^2
-        dist = np.array(list(map(lambda b: np.sum((X - b) ** 2, axis=1), B)))
-        closest_cluster_id = dist.argmin(0)
-        dist = dist[closest_cluster_id, np.arange(n)]
+    B = _dense(X[i])
+    # d_A(x,y) = is \|x-y\|_2^2
+    dist = _sq_dist(X, B[0], X_norm2)
+    closest_cluster_id = np.zeros(n, dtype=int)
+    for j in range(1, k):
         p = dist / dist.sum()
         i = np.random.choice(n, 1, replace=False, p=p)[0]
-        B = np.vstack((B, X[i]))
-    return B
+        B = np.vstack((B, _dense(X[[i]])))
+        # only the new center can be closer than the current closest one
+        dist_new = _sq_dist(X, B[j], X_norm2)
+        closer = dist_new < dist
+        dist[closer] = dist_new[closer]
+        closest_cluster_id[closer] = j
+    return B, closest_cluster_id, dist
 
 
 # "lucic-cs" in the paper
@@ -47,36 +86,231 @@ def lucic_coreset(X, m, k):
     # Strong Coresets for Hard and Soft Bregman Clustering with Applications to Exponential Family Mixtures
     # Lucic et al. (2016)
     n = X.shape[0]
-    B = mahanalobis_d2_sampling(X, k)
-    a = 16 * (np.log(k) + 2)
-    # d_A(x,y) = is \|x-y\|_2^2
-    dist = np.array(list(map(lambda b: np.sum((X - b) ** 2, axis=1), B)))
-    closest_cluster_id = dist.argmin(0)
-    dist = dist[closest_cluster_id, np.arange(n)]
-    c = dist.mean()
-    s = np.zeros(n)
-    for i in range(n):
-        Bi_cardinality = np.sum(closest_cluster_id == closest_cluster_id[i])
-        tmp = dist[closest_cluster_id == closest_cluster_id[i]].sum()
-        s[i] = (
-            a * dist[i] / c
-            + 2 * a * tmp / (Bi_cardinality * c)
-            + 4 * n / Bi_cardinality
-        )
-    p = s / s.sum()
+    p = _lucic_sensitivity(X, k)
     ind = np.random.choice(n, m, p=p)
     X_C = X[ind]
     w_C = 1 / (m * p[ind])
     return X_C, w_C
 
 
+# normalized sensitivities of "lucic-cs"
+def _lucic_sensitivity(X, k):
+    n = X.shape[0]
+    B, closest_cluster_id, dist = _d2_sampling(X, k)
+    a = 16 * (np.log(k) + 2)
+    c = dist.mean()
+    # cardinality and sum of distances of each cluster B_i
+    Bi_cardinality = np.bincount(closest_cluster_id, minlength=k)[closest_cluster_id]
+    tmp = np.bincount(closest_cluster_id, weights=dist, minlength=k)[closest_cluster_id]
+    s = a * dist / c + 2 * a * tmp / (Bi_cardinality * c) + 4 * n / Bi_cardinality
+    return s / s.sum()
+
+
 # proposed coreset
 # "abs-cs" in the paper; outlined in Algorithm 2
 def coreset(X, m):
     n = X.shape[0]
-    dist = np.sum((X - X.mean(axis=0)) ** 2, axis=1)
+    dist = _sq_dist(X, _mean(X))
     q = dist / dist.sum()
     ind = np.random.choice(n, m, p=q)
     X_C = X[ind]
     w_C = 1 / (m * q[ind])
     return X_C, w_C
+
+
+def _dense(X):
+    return X.toarray() if sp.issparse(X) else X
+
+
+# sampling distribution of "abs-cs", "lw-cs" or "lucic-cs" computed once per
+# data set, with its CDF as index: every draw of m points then costs one
+# searchsorted of m uniforms, O(m log n), instead of O(n d) for the
+# sensitivities and O(n) for the CDF; with the same random state it draws
+# the same indices as np.random.choice(n, m, p=q)
+class SamplingIndex:
+    def __init__(self, X, method="abs-cs", k=None):
+        n = X.shape[0]
+        if method == "abs-cs":
+            dist = _sq_dist(X, _mean(X))
+            q = dist / dist.sum()
+        elif method == "lw-cs":
+            dist = _sq_dist(X, _mean(X))
+            q = 0.5 * 1 / n + 0.5 * dist / dist.sum()
+        elif method == "lucic-cs":
+            # note: the D^2-sampled centers are fixed for all draws
+            q = _lucic_sensitivity(X, k)
+        else:
+            raise NotImplementedError
+        self.method = method
+        self.q = q
+        self.cdf = np.cumsum(q)
+        self.cdf /= self.cdf[-1]
+
+    # indices of m points; random_state is None for numpy's global state,
+    # a seed, or a np.random.RandomState, e.g. one stream per worker
+    def sample(self, m, random_state=None):
+        if random_state is None:
+            u = np.random.random_sample(m)
+        elif isinstance(random_state, np.random.RandomState):
+            u = random_state.random_sample(m)
+        else:
+            u = np.random.RandomState(random_state).random_sample(m)
+        return self.cdf.searchsorted(u, side="right")
+
+    def draw(self, X, m, random_state=None):
+        if X.shape[0] != self.q.shape[0]:
+            raise ValueError(
+                "SamplingIndex of %d points used on %d points"
+                % (self.q.shape[0], X.shape[0])
+            )
+        ind = self.sample(m, random_state)
+        X_C = X[ind]
+        w_C = 1 / (m * self.q[ind])
+        return X_C, w_C
+
+    # same interface as the samplers in experiments.py; X has to be the data
+    # the index was built on
+    def __call__(self, X, m, k):
+        return self.draw(X, m)
+
+
+# "abs-cs" of a weighted set, e.g. of a union of coresets
+def weighted_coreset(X, w, m):
+    mean = np.dot(w, X) / w.sum()
+    dist = w * np.sum((X - mean) ** 2, axis=1)
+    q = dist / dist.sum()
+    ind = np.random.choice(X.shape[0], m, p=q)
+    X_C = X[ind]
+    w_C = w[ind] / (m * q[ind])
+    return X_C, w_C
+
+
+# merge-and-reduce tree of "abs-cs" coresets for data arriving in batches;
+# rows are buffered until leaf_size of them are reduced to a coreset of
+# size m, two coresets of the same level are merged and reduced into one
+# of the next level, so at most one coreset per level is kept, i.e.
+# O(m log(n / leaf_size)) rows after n appended rows
+class StreamingCoreset:
+    def __init__(self, m, leaf_size=None):
+        self.m = m
+        self.leaf_size = 4 * m if leaf_size is None else leaf_size
+        self.levels = []  # (X_C, w_C) or None per level
+        self.buffer = []
+        self.n_buffer = 0
+        self.n_seen = 0
+
+    def append(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        self.n_seen += X.shape[0]
+        start = 0
+        if self.n_buffer > 0 and self.n_buffer + X.shape[0] >= self.leaf_size:
+            # complete the leaf begun by earlier batches
+            start = self.leaf_size - self.n_buffer
+            self._leaf(np.vstack(self.buffer + [X[:start]]))
+            self.buffer = []
+            self.n_buffer = 0
+        # whole leaves are cut out of X directly, so that every row is
+        # copied at most once whatever the size of the batch
+        while X.shape[0] - start >= self.leaf_size:
+            self._leaf(X[start : start + self.leaf_size])
+            start += self.leaf_size
+        if start < X.shape[0]:
+            # a copy, the rest of X need not be kept alive
+            self.buffer.append(X[start:].copy())
+            self.n_buffer += X.shape[0] - start
+
+    def _leaf(self, X):
+        self._insert(weighted_coreset(X, np.ones(X.shape[0]), self.m), 0)
+
+    def _insert(self, C, level):
+        # carry upwards like a binary counter
+        while level < len(self.levels) and self.levels[level] is not None:
+            X_C = np.vstack((self.levels[level][0], C[0]))
+            w_C = np.hstack((self.levels[level][1], C[1]))
+            C = weighted_coreset(X_C, w_C, self.m)
+            self.levels[level] = None
+            level += 1
+        if level == len(self.levels):
+            self.levels.append(None)
+        self.levels[level] = C
+
+    # the union of all levels and the buffered rows; if m is given the
+    # union is reduced to a coreset of size m
+    def coreset(self, m=None):
+        parts = [C for C in self.levels if C is not None]
+        if self.n_buffer > 0:
+            X = np.vstack(self.buffer)
+            parts.append((X, np.ones(X.shape[0])))
+        X_C = np.vstack([C[0] for C in parts])
+        w_C = np.hstack([C[1] for C in parts])
+        if m is not None and m < X_C.shape[0]:
+            X_C, w_C = weighted_coreset(X_C, w_C, m)
+        return X_C, w_C
+
+
+# chunks of rows of X; X may be an array (e.g. a np.memmap), the path of a
+# .npy file which is memory-mapped, or a function returning a new iterator
+# over chunks each time it is called (one call per pass)
+def iterate_chunks(X, chunk_size=65536):
+    if callable(X):
+        for chunk in X():
+            yield np.asarray(_dense(chunk), dtype=float)
+        return
+    if isinstance(X, str):
+        X = np.load(X, mmap_mode="r")
+    for start in range(0, X.shape[0], chunk_size):
+        yield np.asarray(_dense(X[start : start + chunk_size]), dtype=float)
+
+
+# "abs-cs" in two passes over chunks of X, for data that does not fit into
+# memory; draws the same sample as coreset() for the same seed (up to
+# rounding in the normalization), memory is O(m d + chunk_size d)
+def coreset_stream(X, m, chunk_size=65536):
+    # first pass: mean and total sensitivity sum_i ||xi - mean||^2, merging
+    # the per-chunk statistics (Chan et al.) to avoid cancellation
+    n = 0
+    mean = None
+    total = 0.0
+    for chunk in iterate_chunks(X, chunk_size):
+        n_chunk = chunk.shape[0]
+        if n_chunk == 0:
+            continue
+        mean_chunk = chunk.mean(axis=0)
+        total_chunk = np.sum((chunk - mean_chunk) ** 2)
+        if mean is None:
+            n, mean, total = n_chunk, mean_chunk, total_chunk
+            continue
+        delta = mean_chunk - mean
+        total += total_chunk + np.sum(delta ** 2) * n * n_chunk / (n + n_chunk)
+        mean = mean + delta * n_chunk / (n + n_chunk)
+        n += n_chunk
+
+    # second pass: sequential multinomial sampling, i.e. inverse transform
+    # sampling of the same uniforms np.random.choice(n, m, p=q) would draw
+    u = np.random.random_sample(m)
+    order = np.argsort(u)
+    u = u[order]
+    X_C = np.zeros((m, mean.shape[0]))
+    w_C = np.zeros(m)
+    offset = 0  # index of the first row of the chunk
+    cdf_offset = 0.0  # probability mass before the chunk
+    j = 0  # next uniform to place
+    for chunk in iterate_chunks(X, chunk_size):
+        if chunk.shape[0] == 0:
+            continue
+        q = np.sum((chunk - mean) ** 2, axis=1) / total
+        cdf = cdf_offset + np.cumsum(q)
+        if offset + chunk.shape[0] >= n:
+            # rounding must not leave uniforms beyond the last chunk
+            last = m
+        else:
+            last = np.searchsorted(u, cdf[-1], side="right")
+        if last > j:
+            ind = np.searchsorted(cdf, u[j:last], side="right")
+            ind = np.minimum(ind, chunk.shape[0] - 1)
+            X_C[order[j:last]] = chunk[ind]
+            w_C[order[j:last]] = 1 / (m * q[ind])
+            j = last
+        offset += chunk.shape[0]
+        cdf_offset = cdf[-1]
+    return X_C, w_C
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.stats import norm
+
+from archetypalanalysis import ArchetypalAnalysis_compute_A, RSS_Z
+from coresets import _sq_dist, _mean
+
+
+# estimate of the full-data RSS from a fixed, stratified evaluation sample;
+# the sample is drawn once per data set and reused for every Z, and the
+# exact RSS is only computed if the confidence interval is too wide
+class SampledRSS:
+    def __init__(
+        self,
+        X,
+        size=10000,
+        strata=10,
+        confidence=0.95,
+        max_rel_width=0.01,
+        solver="batch",
+        seed=0,
+    ):
+        n = X.shape[0]
+        rng = np.random.RandomState(seed)
+        self.n = n
+        self.confidence = confidence
+        self.max_rel_width = max_rel_width
+        self.solver = solver
+
+        # strata by distance to the mean, i.e. by abs-cs sensitivity; points
+        # far away dominate the RSS and get their own strata
+        dist = _sq_dist(X, _mean(X))
+        edges = np.quantile(dist, np.linspace(0, 1, strata + 1)[1:-1])
+        stratum = np.searchsorted(edges, dist, side="right")
+        self.N_h = np.bincount(stratum, minlength=strata)
+        # Neyman-like allocation with sqrt of the mean distance as proxy for
+        # the spread of the residuals, at least two points per stratum
+        proxy = self.N_h * np.sqrt(
+            np.bincount(stratum, weights=dist, minlength=strata)
+            / np.maximum(self.N_h, 1)
+        )
+        n_h = np.maximum(np.round(size * proxy / proxy.sum()).astype(int), 2)
+        n_h = np.minimum(n_h, self.N_h)
+        ind = [
+            rng.choice(np.flatnonzero(stratum == h), n_h[h], replace=False)
+            for h in range(strata)
+        ]
+        self.n_h = n_h
+        self.ind = np.hstack(ind)
+        self.stratum = np.repeat(np.arange(strata), n_h)
+        # cached set-up of the evaluation sample
+        X_E = X[self.ind]
+        if sp.issparse(X_E):
+            X_E = X_E.toarray()
+        self.X_E = np.ascontiguousarray(X_E, dtype=float)
+
+    # estimate and confidence interval of the RSS of Z on all data
+    def estimate(self, Z, M=1000.0):
+        A = ArchetypalAnalysis_compute_A(self.X_E, Z, M, self.solver)
+        r = np.sum((self.X_E - np.dot(A, Z)) ** 2, axis=1)
+        strata = self.N_h.shape[0]
+        n_h = np.maximum(self.n_h, 1)
+        mean_h = np.bincount(self.stratum, weights=r, minlength=strata) / n_h
+        var_h = np.bincount(
+            self.stratum, weights=(r - mean_h[self.stratum]) ** 2, minlength=strata
+        ) / np.maximum(self.n_h - 1, 1)
+        # finite population correction
+        fpc = 1 - self.n_h / np.maximum(self.N_h, 1)
+        rss = np.sum(self.N_h * mean_h)
+        se = np.sqrt(np.sum(self.N_h ** 2 * fpc * var_h / n_h))
+        z = norm.ppf(0.5 + self.confidence / 2)
+        return rss, (rss - z * se, rss + z * se)
+
+    # RSS of Z on all data: the estimate if its interval is narrow enough,
+    # the exact value otherwise
+    def rss(self, X, Z, M=1000.0):
+        rss, ci = self.estimate(Z, M)
+        if ci[1] - ci[0] <= self.max_rel_width * rss:
+            return rss, ci, False
+        A = ArchetypalAnalysis_compute_A(X, Z, M, self.solver)
+        rss = RSS_Z(X, A, Z)
+        return rss, (rss, rss), True
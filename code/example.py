@@ -31,7 +31,7 @@ X_C, w_C = coreset(X, m)
 ind = FurthestSum(X_C, k)
 Z_init = X_C[ind].copy()
 # run weighted Archetypal Analysis
-W = np.diag(np.sqrt(w_C))
+W = np.sqrt(w_C)  # diagonal of the weight matrix
 Z, A, B, rss = weightedArchetypalAnalysis(X_C, Z_init, k, W)
 # recompute the load matrix on all data
 A = ArchetypalAnalysis_compute_A(X, Z)
@@ -3,6 +3,8 @@
 
 data_path = "/home/sebastian/data/"
 results_path = "/home/sebastian/test/run/"
+# binary copies of the data sets, see utils.load_data()
+cache_path = data_path + "cache/"
 
 # specify list of sample sizes m
 M = [1000, 2000, 3000, 4000, 5000, 6000, 7000, 8000]
@@ -2,210 +2,223 @@
 # -*- coding: utf-8 -*-
 
 import ray
+import zlib
 import numpy as np
+import scipy.sparse as sp
 from tqdm import tqdm
 from time import time
 
 from coresets import *
 from archetypalanalysis import *
+from online import onlineArchetypalAnalysis
+from telemetry import Telemetry, aggregate
 
 
-def experiment_AA_full(X, k):
+# telemetry is the path of a JSON lines file for the per-iteration events
+def experiment_AA_full(X, k, n_jobs=None, telemetry=None):
+    if sp.issparse(X):
+        # AA on all data works on dense X^t in the B-step anyway
+        X = X.toarray()
     t_start = time()
     # initialize archetypes via FurthestSum
     ind = FurthestSum(X, k)
     Z_init = X[ind].copy()
     # run Archetypal Analysis
-    Z, A, B, rss = ArchetypalAnalysis(X, Z_init, k)
+    if telemetry is not None:
+        telemetry = Telemetry(telemetry, k=k, method="full")
+    Z, A, B, rss = ArchetypalAnalysis(X, Z_init, k, n_jobs=n_jobs, telemetry=telemetry)
     t_end = time()
     runtime = t_end - t_start
     print(len(rss))
     # recompute the load matrix on all data (just to be sure)
-    A = ArchetypalAnalysis_compute_A(X, Z)
+    A = ArchetypalAnalysis_compute_A(X, Z, n_jobs=n_jobs)
     # measure the error on all data
     rss = RSS_Z(X, A, Z)
     return rss, runtime
 
 
-@ray.remote
-def experiment_AA_uniform_sample(X, k, m, repetitions):
-    n = X.shape[0]
-    res = []
-    res_time = []
-    for i in range(repetitions):
-        t_start = time()
-        # obtain subset
-        X_US = uniform_sample(X, m)
-        # initialize archetypes via FurthestSum
-        ind = FurthestSum(X_US, k)
-        Z_init = X_US[ind].copy()
-        # run Archetypal Analysis
-        Z, A, B, rss = ArchetypalAnalysis(X_US, Z_init, k)
-        t_end = time()
-        runtime = t_end - t_start
-        res_time.append(runtime)
-        print(
-            "{}iter, exp_AA_us, k={}, m={}, {}/{}".format(
-                len(rss), k, m, i + 1, repetitions
-            )
-        )
-        # recompute the load matrix on all data
-        A = ArchetypalAnalysis_compute_A(X, Z)
-        # measure the error on all data
-        rss = RSS_Z(X, A, Z)
-        res.append(rss)
-    return res, res_time
-
-
-@ray.remote
-def experiment_AA_coreset(X, k, m, repetitions):
-    res = []
-    res_time = []
-    for i in range(repetitions):
-        t_start = time()
-        # obtain subset
-        X_C, w_C = coreset(X, m)
-        # initialize archetypes via FurthestSum
-        ind = FurthestSum(X_C, k)
-        Z_init = X_C[ind].copy()
-        # run weighted Archetypal Analysis
-        W = np.diag(np.sqrt(w_C))
-        Z, A, B, rss = weightedArchetypalAnalysis(X_C, Z_init, k, W)
-        t_end = time()
-        runtime = t_end - t_start
-        res_time.append(runtime)
-        print(
-            "{}iter, exp_AA_cs, k={}, m={}, {}/{}".format(
-                len(rss), k, m, i + 1, repetitions
-            )
-        )
-        # recompute the load matrix on all data
-        A = ArchetypalAnalysis_compute_A(X, Z)
-        # measure the error on all data
-        rss = RSS_Z(X, A, Z)
-        res.append(rss)
-    return res, res_time
-
-
-@ray.remote
-def experiment_AA_lightweight_coreset(X, k, m, repetitions):
-    res = []
-    res_time = []
-    for i in range(repetitions):
-        t_start = time()
-        # obtain subset
-        X_C, w_C = lightweight_coreset(X, m)
-        # initialize archetypes via FurthestSum
-        ind = FurthestSum(X_C, k)
-        Z_init = X_C[ind].copy()
-        # run weighted Archetypal Analysis
-        W = np.diag(np.sqrt(w_C))
-        Z, A, B, rss = weightedArchetypalAnalysis(X_C, Z_init, k, W)
-        t_end = time()
-        runtime = t_end - t_start
-        res_time.append(runtime)
-        print(
-            "{}iter, exp_AA_lwcs, k={}, m={}, {}/{}".format(
-                len(rss), k, m, i + 1, repetitions
-            )
-        )
-        # recompute the load matrix on all data
-        A = ArchetypalAnalysis_compute_A(X, Z)
-        # measure the error on all data
-        rss = RSS_Z(X, A, Z)
-        res.append(rss)
-    return res, res_time
-
-
-@ray.remote
-def experiment_AA_lucic_coreset(X, k, m, repetitions):
-    res = []
-    res_time = []
-    for i in range(repetitions):
-        t_start = time()
-        # obtain subset
-        X_C, w_C = lucic_coreset(X, m, k)
-        # initialize archetypes via FurthestSum
-        ind = FurthestSum(X_C, k)
-        Z_init = X_C[ind].copy()
-        # run weighted Archetypal Analysis
-        W = np.diag(np.sqrt(w_C))
-        Z, A, B, rss = weightedArchetypalAnalysis(X_C, Z_init, k, W)
-        t_end = time()
-        runtime = t_end - t_start
-        res_time.append(runtime)
-        print(
-            "{}iter, exp_AA_lucic, k={}, m={}, {}/{}".format(
-                len(rss), k, m, i + 1, repetitions
-            )
-        )
-        # recompute the load matrix on all data
-        A = ArchetypalAnalysis_compute_A(X, Z)
-        # measure the error on all data
-        rss = RSS_Z(X, A, Z)
-        res.append(rss)
-    return res, res_time
-
-
-def experiment_AA_uniform_sample_parallel(X, k, m, repetitions, parallel=10):
-    reps = int(repetitions / parallel)
-
-    # start $parallel tasks in parallel
-    result_ids = []
-    for i in range(parallel):
-        result_ids.append(experiment_AA_uniform_sample.remote(X, k, m, reps))
-
-    result = ray.get(result_ids)
-
-    res = np.array(list(map(lambda x: x[0], result))).flatten()
-    res_time = np.array(list(map(lambda x: x[1], result))).flatten()
+# online AA on mini-batches as a cheaper baseline on all data; X can be
+# the path of a .npy file, which is then read memory-mapped in chunks
+def experiment_AA_online(
+    X, k, batch_size=1024, n_epochs=1, n_jobs=None, telemetry=None
+):
+    if isinstance(X, str):
+        X = np.load(X, mmap_mode="r")
+    t_start = time()
+    # initialize archetypes via FurthestSum on the first chunk
+    X_init = X[:65536]
+    X_init = X_init.toarray() if sp.issparse(X_init) else np.asarray(X_init)
+    ind = FurthestSum(X_init, k)
+    Z_init = X_init[ind].copy()
+    # run online Archetypal Analysis
+    if telemetry is not None:
+        telemetry = Telemetry(telemetry, k=k, method="online")
+    Z, B, X_C, rss = onlineArchetypalAnalysis(
+        X, Z_init, k, batch_size=batch_size, n_epochs=n_epochs, telemetry=telemetry
+    )
+    t_end = time()
+    runtime = t_end - t_start
+    print(len(rss))
+    # compute the load matrix and measure the error on all data
+    A = ArchetypalAnalysis_compute_A(X, Z, n_jobs=n_jobs)
+    rss = RSS_Z(X, A, Z)
+    return rss, runtime
 
-    return res, res_time
 
+# samplers get (X, m, k) and return a subset X_C and its weights w_C;
+# w_C is None for unweighted subsets
+def sample_uniform(X, m, k):
+    return uniform_sample(X, m), None
 
-def experiment_AA_coreset_parallel(X, k, m, repetitions, parallel=10):
-    reps = int(repetitions / parallel)
 
-    # start $parallel tasks in parallel
-    result_ids = []
-    for i in range(parallel):
-        result_ids.append(experiment_AA_coreset.remote(X, k, m, reps))
+def sample_lightweight_coreset(X, m, k):
+    return lightweight_coreset(X, m)
 
-    result = ray.get(result_ids)
 
-    res = np.array(list(map(lambda x: x[0], result))).flatten()
-    res_time = np.array(list(map(lambda x: x[1], result))).flatten()
+def sample_coreset(X, m, k):
+    return coreset(X, m)
 
-    return res, res_time
 
+def sample_lucic_coreset(X, m, k):
+    return lucic_coreset(X, m, k)
 
-def experiment_AA_lightweight_coreset_parallel(X, k, m, repetitions, parallel=10):
-    reps = int(repetitions / parallel)
 
-    # start $parallel tasks in parallel
-    result_ids = []
-    for i in range(parallel):
-        result_ids.append(experiment_AA_lightweight_coreset.remote(X, k, m, reps))
+samplers = {
+    "uniform": sample_uniform,
+    "lw-cs": sample_lightweight_coreset,
+    "abs-cs": sample_coreset,
+    "lucic-cs": sample_lucic_coreset,
+}
 
-    result = ray.get(result_ids)
 
-    res = np.array(list(map(lambda x: x[0], result))).flatten()
-    res_time = np.array(list(map(lambda x: x[1], result))).flatten()
+# one repetition: sample, fit AA on the sample, measure the error on all data;
+# with an evaluation.SampledRSS the error on all data is estimated from its
+# evaluation sample, unless the confidence interval is too wide; with a
+# telemetry path the per-iteration events are appended to it and their
+# summary is returned with the result; name defaults to sampler_name(sampler)
+@ray.remote
+def experiment_AA_sample(
+    X, k, m, sampler, seed, evaluation=None, telemetry=None, name=None
+):
+    if name is None:
+        name = sampler_name(sampler)
+    if isinstance(sampler, str):
+        sampler = samplers[sampler]
+    np.random.seed(seed)
+    t_start = time()
+    # obtain subset; small enough to be dense even if X is scipy.sparse
+    X_C, w_C = sampler(X, m, k)
+    if sp.issparse(X_C):
+        X_C = X_C.toarray()
+    # initialize archetypes via FurthestSum
+    ind = FurthestSum(X_C, k)
+    Z_init = X_C[ind].copy()
+    info = {}
+    if telemetry is not None:
+        telemetry = Telemetry(telemetry, k=k, method=name, m=m, seed=seed)
+    if w_C is None:
+        # run Archetypal Analysis
+        Z, A, B, rss = ArchetypalAnalysis(X_C, Z_init, k, telemetry=telemetry)
+    else:
+        # run weighted Archetypal Analysis
+        W = np.sqrt(w_C)  # diagonal of the weight matrix
+        Z, A, B, rss = weightedArchetypalAnalysis(
+            X_C, Z_init, k, W, telemetry=telemetry
+        )
+    t_end = time()
+    runtime = t_end - t_start
+    print("{}iter, exp_AA_{}, k={}, m={}".format(len(rss), name, k, m))
+    if telemetry is not None:
+        info["telemetry"] = telemetry.summary()
+    if evaluation is not None:
+        rss, ci, exact = evaluation.rss(X, Z)
+        info.update({"rss_ci": list(ci), "rss_exact": exact})
+        return rss, runtime, info
+    # recompute the load matrix on all data
+    A = ArchetypalAnalysis_compute_A(X, Z)
+    # measure the error on all data
+    rss = RSS_Z(X, A, Z)
+    return rss, runtime, info
+
+
+def sampler_name(sampler):
+    return sampler if isinstance(sampler, str) else sampler.__name__
+
+
+# fixed seed of each repetition, so a resumed sweep draws the same samples
+def repetition_seed(k, sampler, m, rep):
+    key = "{}-{}-{}-{}".format(k, sampler_name(sampler), m, rep)
+    return zlib.crc32(key.encode())
+
+
+# X should be put into the object store once per data set, i.e.
+# X = ray.put(X), otherwise every task serializes it again;
+# sampler is a key of samplers or a function like the ones above;
+# with a ResultStore every repetition is stored as soon as it finishes
+# and repetitions already in the store are not run again; evaluation is
+# passed on to experiment_AA_sample and should be put into the object
+# store once as well, so should a sampler object (e.g. a SamplingIndex),
+# which then needs a name
+def experiment_AA_parallel(
+    X,
+    k,
+    m,
+    repetitions,
+    sampler,
+    store=None,
+    evaluation=None,
+    name=None,
+    telemetry=None,
+):
+    if isinstance(X, np.ndarray):
+        X = ray.put(X)
+    if name is None:
+        name = sampler_name(sampler)
+    todo = [
+        rep
+        for rep in range(repetitions)
+        if store is None or not store.done(k, name, m, rep)
+    ]
+    # one task per repetition
+    result_ids = {
+        experiment_AA_sample.remote(
+            X,
+            k,
+            m,
+            sampler,
+            repetition_seed(k, name, m, rep),
+            evaluation,
+            telemetry,
+            name,
+        ): rep
+        for rep in todo
+    }
+
+    result = {}
+    pending = list(result_ids)
+    while pending:
+        ready, pending = ray.wait(pending, num_returns=1)
+        rep = result_ids[ready[0]]
+        result[rep] = ray.get(ready[0])
+        if store is not None:
+            rss, runtime, info = result[rep]
+            store.add(k, name, m, rep, rss, runtime, **info)
+
+    if store is not None:
+        return store.collect(k, name, m, repetitions)
+
+    res = np.array([result[rep][0] for rep in range(repetitions)])
+    res_time = np.array([result[rep][1] for rep in range(repetitions)])
 
     return res, res_time
 
 
-def experiment_AA_lucic_coreset_parallel(X, k, m, repetitions, parallel=10):
-    reps = int(repetitions / parallel)
-
-    # start $parallel tasks in parallel
-    result_ids = []
-    for i in range(parallel):
-        result_ids.append(experiment_AA_lucic_coreset.remote(X, k, m, reps))
-
-    result = ray.get(result_ids)
-
-    res = np.array(list(map(lambda x: x[0], result))).flatten()
-    res_time = np.array(list(map(lambda x: x[1], result))).flatten()
-
-    return res, res_time
+# telemetry of all repetitions of one configuration, aggregated
+def summarize_telemetry(store, k, method, m, repetitions):
+    return aggregate(
+        [
+            store.get(k, method, m, rep).get("telemetry")
+            for rep in range(repetitions)
+            if store.done(k, method, m, rep)
+        ]
+    )
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from time import time
+
+from archetypalanalysis import (
+    ArchetypalAnalysis,
+    weightedArchetypalAnalysis,
+    FurthestSum,
+    boundary_candidates,
+    _dense,
+    _norm2,
+)
+
+
+# AA for an increasing sequence of k on the same data (e.g. one coreset
+# with weights W): every fit starts from the archetypes of the previous k
+# plus k - k_prev points outside their hull (see below), so only the new
+# archetypes have to move far; the dense X, ||X||_F^2 and a
+# candidate set for the B-step are set up once for all k, and the NNLS
+# solves are warm-started (unless warm_start=False is passed) from the A
+# and B of the previous k, padded for the new archetypes; returns the fits
+# and the RSS-vs-k curve (of the weighted problem if W is given)
+def kpathArchetypalAnalysis(X, ks, W=None, candidates=None, seed=0, **kwargs):
+    kwargs.setdefault("warm_start", True)
+    X = np.ascontiguousarray(_dense(X), dtype=float)
+    np.random.seed(seed)
+    if candidates is not None and np.isscalar(candidates):
+        # a fixed candidate set for all k, updated within each fit
+        candidates = boundary_candidates(X, int(candidates))
+    kwargs["X_norm2"] = _norm2(X)
+    n = X.shape[0]
+    fits = []
+    Z = None
+    for k in sorted(ks):
+        t_start = time()
+        if Z is None:
+            Z_init = X[FurthestSum(X, k)]
+            A_init = B_init = None
+        else:
+            # the new archetypes are spread out (by FurthestSum relative to
+            # Z) over the points worst explained by the previous fit, i.e.
+            # those furthest outside the hull of its archetypes
+            residual = np.sum((X - np.dot(A, Z)) ** 2, axis=1)
+            worst = np.argsort(residual)[::-1][: 10 * (k - Z.shape[0])]
+            new = worst[FurthestSum(X[worst], k - Z.shape[0], Z)]
+            Z_init = np.vstack((Z, X[new]))
+            # no point uses the new archetypes yet, each of which is one point
+            A_init = np.hstack((A, np.zeros((n, len(new)), dtype=A.dtype)))
+            B_new = np.zeros((len(new), n))
+            B_new[np.arange(len(new)), new] = 1.0
+            B_init = np.vstack((B, B_new))
+        if W is None:
+            Z, A, B, rss = ArchetypalAnalysis(
+                X,
+                Z_init,
+                k,
+                candidates=candidates,
+                A_init=A_init,
+                B_init=B_init,
+                **kwargs
+            )
+        else:
+            Z, A, B, rss = weightedArchetypalAnalysis(
+                X,
+                Z_init,
+                k,
+                W,
+                candidates=candidates,
+                A_init=A_init,
+                B_init=B_init,
+                **kwargs
+            )
+        fits.append(
+            {
+                "k": k,
+                "Z": Z,
+                "A": A,
+                "B": B,
+                "rss": rss,
+                "iterations": len(rss),
+                "runtime": time() - t_start,
+            }
+        )
+    curve = np.array([[fit["k"], fit["rss"][-1]] for fit in fits])
+    return fits, curve
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+# solve all columns of  min_x || Q x - b ||_2  s.t.  x >= 0  at once,
+# given only the Gram form  G = Q^t Q  (k x k)  and  C = Q^t B  (k x r)
+# optionally warm-started from the passive sets P (k x r) of a previous solve
+def nnls_gram(G, C, P=None, max_iter=None, tol=None):
+    # Fast Combinatorial Nonnegative Least-Squares
+    # Van Benthem and Keenan, 2004
+    # i.e., Lawson-Hanson active-set iterations for all right-hand sides
+    # simultaneously; the passive systems are solved in one batch
+    k, r = C.shape
+    if max_iter is None:
+        max_iter = 3 * k
+    if tol is None:
+        tol = 10 * k * np.finfo(float).eps * max(np.abs(G).max(), 1.0)
+
+    X = np.zeros((k, r))
+    iterations = np.zeros(r, dtype=int)
+    capped = np.zeros(r, dtype=bool)  # columns stopped before convergence
+    if P is None:
+        P = np.zeros((k, r), dtype=bool)  # passive set of each column
+        W = C.copy()  # negative gradient, W = C - G X
+    else:
+        # warm start: shrink the given passive sets until the unconstrained
+        # solutions on them are feasible, which is a valid starting point
+        P = P.copy()
+        todo = np.flatnonzero(P.any(axis=0))
+        while todo.size > 0:
+            Zt = _solve_passive(G, C[:, todo], P[:, todo])
+            iterations[todo] += 1
+            X[:, todo] = np.where(P[:, todo], Zt, 0.0)
+            infeasible = ((Zt <= tol) & P[:, todo]).any(axis=0)
+            P[:, todo] &= Zt > tol
+            todo = todo[infeasible]
+        X[~P] = 0.0
+        W = C - np.dot(G, X)
+    # the shrink steps of a warm start do not count towards max_iter
+    limit = iterations + max_iter
+    # columns whose KKT conditions are violated
+    todo = np.flatnonzero((np.where(P, -np.inf, W) > tol).any(axis=0))
+
+    while todo.size > 0:
+        # move the most violating index of each column to its passive set
+        Wt = np.where(P[:, todo], -np.inf, W[:, todo])
+        P[Wt.argmax(axis=0), todo] = True
+        iterations[todo] += 1
+
+        # solve the unconstrained problems on the passive sets
+        Zt = _solve_passive(G, C[:, todo], P[:, todo])
+
+        # inner loop: step back into the feasible region
+        infeasible = ((Zt <= tol) & P[:, todo]).any(axis=0)
+        inner = 0
+        while infeasible.any() and inner < max_iter:
+            inner += 1
+            cols = todo[infeasible]
+            Xi = X[:, cols]
+            Zi = Zt[:, infeasible]
+            Pi = P[:, cols]
+            # largest step keeping all passive variables non-negative
+            neg = Pi & (Zi <= tol)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                alpha = np.where(neg, Xi / (Xi - Zi), np.inf)
+            alpha = alpha.min(axis=0)
+            Xi = Xi + alpha * (Zi - Xi)
+            # remove variables that hit zero from the passive set
+            Pi &= Xi > tol
+            Xi[~Pi] = 0.0
+            X[:, cols] = Xi
+            P[:, cols] = Pi
+            iterations[cols] += 1
+            Zt[:, infeasible] = _solve_passive(G, C[:, cols], Pi)
+            infeasible[infeasible] = ((Zt[:, infeasible] <= tol) & Pi).any(axis=0)
+
+        # columns whose inner loop was cut off keep their last feasible X
+        capped[todo[infeasible]] = True
+        Zt = Zt[:, ~infeasible]
+        todo = todo[~infeasible]
+        X[:, todo] = np.where(P[:, todo], Zt, 0.0)
+
+        # check optimality of the columns that were touched
+        W[:, todo] = C[:, todo] - np.dot(G, X[:, todo])
+        violated = (np.where(P[:, todo], -np.inf, W[:, todo]) > tol).any(axis=0)
+        capped[todo[violated & (iterations[todo] >= limit[todo])]] = True
+        todo = todo[violated & (iterations[todo] < limit[todo])]
+
+    # report only the stopped columns that violate their KKT conditions
+    cols = np.flatnonzero(capped)
+    W = C[:, cols] - np.dot(G, X[:, cols])
+    failed = np.count_nonzero(_violated(X[:, cols], W, _report_tol(tol, G)))
+    if failed > 0:
+        print(
+            "nnls_gram() reached max. iterations for %d of %d columns; "
+            "not converged" % (failed, r)
+        )
+
+    return X, iterations
+
+
+# columns of X violating the KKT conditions of NNLS, given the negative
+# gradient W: zero entries need W <= tol, positive entries |W| <= tol
+def _violated(X, W, tol):
+    return (np.where(X > 0, np.abs(W), W) > tol).any(axis=0)
+
+
+# tolerance of the KKT check behind the max. iterations warnings, given the
+# Gram matrix (or its scale); with an ill-conditioned Gram matrix, e.g. for
+# k > d + 1, columns cycle at the optimum on rounding errors far above the
+# solver's tol, so only violations above sqrt(eps) of its scale are reported
+def _report_tol(tol, G):
+    return max(tol, np.sqrt(np.finfo(float).eps) * max(np.abs(G).max(), 1.0))
+
+
+# solve G[P,P] z = C[P] for every column; columns with passive sets of equal
+# size are gathered into one batch of small systems
+def _solve_passive(G, C, P):
+    k, r = C.shape
+    Z = np.zeros((k, r))
+    size = P.sum(axis=0)
+    # passive indices of each column first
+    order = np.argsort(~P, axis=0, kind="stable").T  # r x k
+    for s in np.unique(size):
+        if s == 0:
+            continue
+        cols = np.flatnonzero(size == s)
+        idx = order[cols, :s]  # |cols| x s
+        Gs = G[idx[:, :, None], idx[:, None, :]]
+        Cs = C[idx, cols[:, None]]
+        try:
+            Zs = np.linalg.solve(Gs, Cs[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            Zs = np.array(
+                [np.linalg.lstsq(g, c, rcond=None)[0] for g, c in zip(Gs, Cs)]
+            )
+        Z[idx, cols[:, None]] = Zs
+    return Z
+
+
+# solve  min_x || Q x - b ||_2  s.t.  x >= 0  for a single right-hand side,
+# optionally warm-started from the passive set P (boolean, one per column of Q)
+def nnls_active(Q, b, P=None, max_iter=None, tol=None):
+    # Lawson-Hanson active-set method, working on Q directly so that only
+    # the columns in the passive set enter the least-squares subproblems
+    n = Q.shape[1]
+    if max_iter is None:
+        max_iter = 3 * n
+    if tol is None:
+        tol = 10 * max(Q.shape) * np.finfo(float).eps * max(np.abs(Q).max() ** 2, 1.0)
+
+    x = np.zeros(n)
+    iterations = 0
+    if P is None:
+        P = np.zeros(n, dtype=bool)
+    else:
+        # warm start: shrink the given passive set until feasible
+        P = P.copy()
+        while P.any():
+            iterations += 1
+            z = np.linalg.lstsq(Q[:, P], b, rcond=None)[0]
+            if (z > tol).all():
+                x[P] = z
+                break
+            P[np.flatnonzero(P)[z <= tol]] = False
+
+    # the shrink steps of a warm start do not count towards max_iter
+    limit = iterations + max_iter
+    w = np.dot(Q.T, b - np.dot(Q[:, P], x[P]))
+    cut = False
+    while iterations < limit:
+        wt = np.where(P, -np.inf, w)
+        j = wt.argmax()
+        if wt[j] <= tol:
+            break
+        P[j] = True
+        iterations += 1
+        z = np.zeros(n)
+        z[P] = np.linalg.lstsq(Q[:, P], b, rcond=None)[0]
+        # inner loop: step back into the feasible region
+        while (z[P] <= tol).any() and iterations < limit:
+            iterations += 1
+            neg = P & (z <= tol)
+            alpha = (x[neg] / (x[neg] - z[neg])).min()
+            x = x + alpha * (z - x)
+            P &= x > tol
+            x[~P] = 0.0
+            z = np.zeros(n)
+            z[P] = np.linalg.lstsq(Q[:, P], b, rcond=None)[0]
+        if (z[P] <= tol).any():
+            # cut off in the inner loop: keep the last feasible x
+            cut = True
+            break
+        x = z
+        w = np.dot(Q.T, b - np.dot(Q[:, P], x[P]))
+
+    if cut:
+        w = np.dot(Q.T, b - np.dot(Q[:, P], x[P]))
+    report_tol = _report_tol(tol, np.abs(Q).max() ** 2)
+    violated = _violated(x[:, None], w[:, None], report_tol)[0]
+    if (cut or iterations >= limit) and violated:
+        print("nnls_active() reached max. iterations; not converged")
+
+    return x, P, iterations
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from archetypalanalysis import (
+    ArchetypalAnalysis_compute_A,
+    ArchetypalAnalysis_compute_B,
+    _B_solver,
+    _counted,
+)
+from coresets import iterate_chunks
+from telemetry import no_telemetry
+
+
+# online archetypal analysis on mini-batches of a stream, an array or the
+# path of a .npy file (read memory-mapped, see iterate_chunks); Z is fit to
+# the sufficient statistics A^t A and A^t X of all batches so far, which
+# decay by (1 - 1/t) ** decay in batch t, and B is solved against a bounded
+# set of candidate points kept along the stream; every update costs
+# O(batch_size k d + candidates k d) regardless of the size of the data
+def onlineArchetypalAnalysis(
+    X,
+    Z,
+    k,
+    batch_size=1024,
+    n_epochs=1,
+    decay=10.0,
+    candidates=2000,
+    M=1000.0,
+    solver="batch",
+    chunk_size=65536,
+    verbose=False,
+    telemetry=None,
+):
+    # initialization
+    if telemetry is None:
+        telemetry = no_telemetry
+    Z = np.array(Z, dtype=float)
+    d = Z.shape[1]
+    AtA = np.zeros((k, k))  # decayed sufficient statistics
+    AtX = np.zeros((k, d))
+    # candidate points; the initial archetypes are points of X, too
+    X_C = Z.copy()
+    B = np.eye(k)
+    n_new = max(candidates // 10, 1)  # candidates taken from each batch
+    t = 0
+    rss = []  # mean RSS of each batch, before it is used for the update
+
+    for epoch in range(n_epochs):
+        for chunk in iterate_chunks(X, chunk_size):
+            # batches in random order within each chunk
+            perm = np.random.permutation(chunk.shape[0])
+            for start in range(0, chunk.shape[0], batch_size):
+                Xb = chunk[np.sort(perm[start : start + batch_size])]
+                t += 1
+
+                # optimization of the ai's of the batch
+                with telemetry.phase("A"):
+                    A, iter_A = ArchetypalAnalysis_compute_A(
+                        Xb, Z, M, solver, return_iterations=True
+                    )
+                residual = np.sum((Xb - np.dot(A, Z)) ** 2, axis=1)
+                rss.append(residual.mean())
+
+                # update the statistics and the (intermediate) archetypes
+                with telemetry.phase("Z"):
+                    beta = (1 - 1.0 / t) ** decay
+                    AtA = beta * AtA + np.dot(A.T, A)
+                    AtX = beta * AtX + np.dot(A.T, Xb)
+                    Z = np.linalg.lstsq(AtA, AtX, rcond=None)[0]
+
+                # points outside the hull of the archetypes are candidates
+                with telemetry.phase("candidates"):
+                    X_C, B = _update_candidates(
+                        X_C, B, Z, Xb, residual, n_new, candidates, M, solver
+                    )
+
+                # optimization of all bj's against the candidates
+                with telemetry.phase("B"):
+                    B, iter_B = ArchetypalAnalysis_compute_B(
+                        X_C, Z, M, return_iterations=True, solver=_B_solver(solver)
+                    )
+                    Z = np.dot(B, X_C)
+                telemetry.iteration(
+                    t,
+                    rss[-1],
+                    _counted(iter_A, solver, False),
+                    _counted(iter_B, _B_solver(solver), False),
+                )
+
+                if verbose:
+                    print("Batch %4d // RSS/n=%.5f" % (t, rss[-1]))
+
+    telemetry.finish(rss=rss[-1] if rss else None)
+    return Z, B, X_C, rss
+
+
+# add the n_new points of the batch with the largest residual (if it is
+# positive), then keep the support of B and the candidates that are worst
+# explained by the intermediate archetypes Z, at most size points
+def _update_candidates(X_C, B, Z, Xb, residual, n_new, size, M, solver):
+    new = np.argsort(residual)[::-1][:n_new]
+    new = new[residual[new] > 0]
+    X_C = np.vstack((X_C, Xb[new]))
+    B = np.hstack((B, np.zeros((B.shape[0], new.size))))
+    if X_C.shape[0] > size:
+        A = ArchetypalAnalysis_compute_A(X_C, Z, M, solver)
+        score = np.sum((X_C - np.dot(A, Z)) ** 2, axis=1)
+        score[(B > 0).any(axis=0)] = np.inf
+        keep = np.sort(np.argsort(score)[::-1][:size])
+        X_C, B = X_C[keep], B[:, keep]
+    return X_C, B
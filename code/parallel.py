@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import weakref
+import numpy as np
+import scipy.sparse as sp
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+
+def effective_n_jobs(n_jobs):
+    # None or 1 means serial, negative values count back from all cores
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(os.cpu_count() + 1 + n_jobs, 1)
+    return max(n_jobs, 1)
+
+
+# numpy array backed by a shared memory segment
+def _to_shared(a, dtype=float):
+    a = np.ascontiguousarray(a, dtype=dtype)
+    shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+    view = np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)
+    view[:] = a
+    return shm, view, (shm.name, a.shape, a.dtype.str)
+
+
+# per worker process: attached shared memory segments
+_shared = {}
+
+
+def _attach(specs, X_shape=None):
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+    if X_shape is not None:
+        X = sp.csr_matrix(
+            (_shared["X_data"][1], _shared["X_indices"][1], _shared["X_indptr"][1]),
+            shape=X_shape,
+            copy=False,
+        )
+        _shared["X"] = (None, X)
+
+
+def _compute_A_rows(args):
+    from archetypalanalysis import ArchetypalAnalysis_compute_A
+
+    start, stop, M, solver, block_size, warm = args
+    X = _shared["X"][1]
+    Z = _shared["Z"][1]
+    A = _shared["A"][1]
+    A_init = A[start:stop].copy() if warm else None
+    A[start:stop], iterations = ArchetypalAnalysis_compute_A(
+        X[start:stop],
+        Z,
+        M,
+        solver,
+        block_size,
+        A_init=A_init,
+        return_iterations=True,
+    )
+    return iterations
+
+
+def _release(pool, segments):
+    pool.terminate()
+    pool.join()
+    for shm in segments:
+        try:
+            shm.close()
+        except BufferError:
+            pass
+        shm.unlink()
+
+
+# process pool for the A-step; X is copied into shared memory once and
+# reused for all calls, only row ranges are sent to the workers
+class ParallelAStep:
+    def __init__(self, X, k, n_jobs=-1, chunks_per_job=4):
+        self.n_jobs = effective_n_jobs(n_jobs)
+        self.n = X.shape[0]
+        self.k = k
+        self.chunks_per_job = chunks_per_job
+        X_shape = None
+        # float32 X stays float32, and so does A (see compute_A)
+        dtype = np.float32 if X.dtype == np.float32 else float
+        if sp.issparse(X):
+            # scipy.sparse X is shared as its CSR arrays
+            X = sp.csr_matrix(X)
+            X_shape = X.shape
+            arrays = {
+                "X_data": (X.data, dtype),
+                "X_indices": (X.indices, np.int64),
+                "X_indptr": (X.indptr, np.int64),
+            }
+        else:
+            arrays = {"X": (X, dtype)}
+        arrays["Z"] = (np.zeros((k, X.shape[1])), float)
+        arrays["A"] = (np.zeros((self.n, k)), dtype)
+        segments = []
+        specs = {}
+        views = {}
+        for key, (a, dtype) in arrays.items():
+            shm, views[key], specs[key] = _to_shared(a, dtype)
+            segments.append(shm)
+        self.Z = views["Z"]
+        self.A = views["A"]
+        del views
+        self.pool = mp.Pool(self.n_jobs, initializer=_attach, initargs=(specs, X_shape))
+        # release the segments even if the caller never gets to close()
+        self._finalizer = weakref.finalize(self, _release, self.pool, segments)
+
+    def compute_A(self, Z, M=1000.0, solver="nnls", block_size=4096, A_init=None):
+        self.Z[:] = Z
+        warm = A_init is not None
+        if warm:
+            self.A[:] = A_init
+        n_chunks = min(self.n, self.n_jobs * self.chunks_per_job)
+        bounds = np.linspace(0, self.n, n_chunks + 1).astype(int)
+        tasks = [
+            (start, stop, M, solver, block_size, warm)
+            for start, stop in zip(bounds[:-1], bounds[1:])
+            if stop > start
+        ]
+        iterations = np.hstack(self.pool.map(_compute_A_rows, tasks))
+        return self.A.copy(), iterations
+
+    def close(self):
+        # views have to go before their segments can be closed
+        del self.Z, self.A
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
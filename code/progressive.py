@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from time import time
+
+from archetypalanalysis import weightedArchetypalAnalysis, FurthestSum, _dense
+from coresets import SamplingIndex
+from evaluation import SampledRSS
+
+
+# coreset AA with the coreset size chosen on the fly instead of fixed: fit on
+# m0 points, then grow m by the factor growth with further points from the
+# same sensitivity distribution, so that the coreset of each level is an
+# i.i.d. sample of its size (the weights 1 / (m q) are rescaled to the new
+# m); every level is warm-started from the archetypes of the previous one
+# and the RSS of its archetypes on all data is estimated on a fixed
+# evaluation sample (see evaluation.SampledRSS); stops once the estimate
+# changes by less than tol (relative) between two levels, or at m_max;
+# sampler is "abs-cs", "lw-cs", "lucic-cs" or a SamplingIndex of X, and
+# evaluation a SampledRSS of X; returns the archetypes, the coreset and
+# its weights of the last level and the levels
+def progressiveArchetypalAnalysis(
+    X,
+    k,
+    m0=500,
+    growth=2.0,
+    m_max=None,
+    tol=1e-2,
+    sampler="abs-cs",
+    evaluation=None,
+    seed=0,
+    **kwargs
+):
+    n = X.shape[0]
+    if m_max is None:
+        m_max = n
+    if isinstance(sampler, str):
+        sampler = SamplingIndex(X, sampler, k)
+    if evaluation is None:
+        # the same sample for all levels, so that the changes between levels
+        # are estimated much more precisely than the RSS itself
+        evaluation = SampledRSS(X, seed=seed)
+    rng = np.random.RandomState(seed)
+    np.random.seed(seed)  # for FurthestSum
+
+    ind = np.zeros(0, dtype=int)
+    m = min(m0, m_max)
+    Z = None
+    levels = []
+    while True:
+        t_start = time()
+        # only the new points are drawn, the earlier ones are kept
+        ind = np.hstack((ind, sampler.sample(m - ind.size, rng)))
+        X_C = _dense(X[ind])
+        w_C = 1 / (m * sampler.q[ind])
+        if Z is None:
+            Z = X_C[FurthestSum(X_C, k)]
+        Z, A, B, rss = weightedArchetypalAnalysis(X_C, Z, k, np.sqrt(w_C), **kwargs)
+        estimate, ci = evaluation.estimate(Z)
+        change = None
+        if levels:
+            change = abs(estimate - levels[-1]["rss"]) / levels[-1]["rss"]
+        levels.append(
+            {
+                "m": m,
+                "rss": estimate,
+                "rss_ci": ci,
+                "change": change,
+                "iterations": len(rss),
+                "runtime": time() - t_start,
+            }
+        )
+        if (change is not None and change < tol) or m >= m_max:
+            break
+        m = min(int(np.ceil(m * growth)), m_max)
+    return Z, X_C, w_C, levels
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import multiprocessing as mp
+from time import time
+
+from archetypalanalysis import (
+    ArchetypalAnalysis,
+    weightedArchetypalAnalysis,
+    ArchetypalAnalysis_compute_A,
+    FurthestSum,
+    _dense,
+    _work_dtype,
+)
+from parallel import effective_n_jobs, _to_shared, _attach, _shared, _release
+
+
+# several restarts of (weighted) AA, raced by successive halving: all
+# restarts run for budget iterations, then only the best 1/eta of those
+# still running continue, for eta times as many iterations, and so on until
+# all have converged or have been aborted; restarts run concurrently on
+# n_jobs processes; the first restart is initialized by FurthestSum on X,
+# the others by FurthestSum on random halves of X (FurthestSum on all of X
+# picks almost the same points whatever its random first point)
+def multistartArchetypalAnalysis(
+    X,
+    k,
+    restarts=8,
+    W=None,
+    budget=10,
+    eta=2,
+    max_iterations=250,
+    n_jobs=-1,
+    seed=0,
+    **kwargs
+):
+    X = _dense(X)
+    X = np.ascontiguousarray(X, dtype=_work_dtype(X))
+    rng = np.random.RandomState(seed)
+    seeds = rng.randint(2 ** 31 - 1, size=restarts)  # of the initializations
+    stats = [
+        {
+            "restart": r,
+            "seed": int(seeds[r]),
+            "iterations": 0,
+            "rss": np.inf,
+            "converged": False,
+            "aborted": None,  # round in which the restart was aborted
+            "runtime": 0.0,
+        }
+        for r in range(restarts)
+    ]
+    Z = {}
+    B = {}
+    rss = {r: [] for r in range(restarts)}
+
+    n_jobs = min(effective_n_jobs(n_jobs), restarts)
+    pool = None
+    if n_jobs > 1:
+        # X is shared with the workers once, like in parallel.ParallelAStep
+        shm, view, spec = _to_shared(X, X.dtype)
+        pool = mp.Pool(n_jobs, initializer=_attach, initargs=({"X": spec},))
+    try:
+        active = list(range(restarts))
+        round_ = 0
+        while active:
+            tasks = [
+                (
+                    Z.get(r),
+                    k,
+                    W,
+                    min(budget, max_iterations - stats[r]["iterations"]),
+                    int(seeds[r]),
+                    r > 0,
+                    kwargs,
+                )
+                for r in active
+            ]
+            if pool is not None:
+                results = pool.map(_advance_shared, tasks)
+            else:
+                results = [_advance(X, *task) for task in tasks]
+
+            running = []
+            for r, task, (Z_r, B_r, rss_r, runtime) in zip(active, tasks, results):
+                Z[r], B[r] = Z_r, B_r
+                rss[r] = rss[r] + rss_r
+                s = stats[r]
+                s["iterations"] += len(rss_r)
+                s["rss"] = float(rss_r[-1])
+                s["runtime"] += runtime
+                # fewer iterations than given means the stop conditions hold;
+                # they are also checked across the rounds
+                s["converged"] = bool(
+                    len(rss_r) < task[3]
+                    or _stop(rss[r][-len(rss_r) - 1 :], kwargs.get("epsilon", 1e-3))
+                )
+                if not s["converged"] and s["iterations"] < max_iterations:
+                    running.append(r)
+
+            # successive halving on the restarts that are still running
+            running.sort(key=lambda r: stats[r]["rss"])
+            keep = int(np.ceil(len(running) / float(eta)))
+            for r in running[keep:]:
+                stats[r]["aborted"] = round_
+            active = running[:keep]
+            budget *= eta
+            round_ += 1
+    finally:
+        if pool is not None:
+            del view
+            _release(pool, [shm])
+
+    best = min(range(restarts), key=lambda r: stats[r]["rss"])
+    A = ArchetypalAnalysis_compute_A(
+        X, Z[best], kwargs.get("M", 1000.0), kwargs.get("solver", "nnls")
+    )
+    return Z[best], A, B[best], rss[best], stats
+
+
+# the stop conditions of the AA loops for the first two of rss
+def _stop(rss, epsilon):
+    if len(rss) < 2:
+        return False
+    return np.abs(rss[1] - rss[0]) / np.abs(rss[1]) < epsilon or rss[1] > rss[0]
+
+
+# continue one restart for a number of iterations, from its initialization
+# if Z is None, by FurthestSum on all of X or on a random half of it
+def _advance(X, Z, k, W, iterations, seed, half, kwargs):
+    t_start = time()
+    np.random.seed(seed)
+    if Z is None and not half:
+        Z = X[FurthestSum(X, k)].copy()
+    elif Z is None:
+        ind = np.random.choice(X.shape[0], max(X.shape[0] // 2, k), replace=False)
+        Z = X[ind[FurthestSum(X[ind], k)]].copy()
+    if W is None:
+        Z, A, B, rss = ArchetypalAnalysis(X, Z, k, max_iterations=iterations, **kwargs)
+    else:
+        Z, A, B, rss = weightedArchetypalAnalysis(
+            X, Z, k, W, max_iterations=iterations, **kwargs
+        )
+    return Z, B, rss, time() - t_start
+
+
+def _advance_shared(args):
+    return _advance(_shared["X"][1], *args)
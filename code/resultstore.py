@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+import numpy as np
+import scipy.sparse as sp
+
+
+# sha256 over shape, dtype and contents of X (its CSR arrays if sparse),
+# read in chunks so that memory-mapped data sets are not loaded at once
+def fingerprint(X, chunk_size=65536):
+    h = hashlib.sha256()
+    h.update(str((X.shape, str(X.dtype))).encode())
+    if sp.issparse(X):
+        X = sp.csr_matrix(X)
+        for a in (X.data, X.indices, X.indptr):
+            h.update(np.ascontiguousarray(a).tobytes())
+        return h.hexdigest()
+    for start in range(0, X.shape[0], chunk_size):
+        h.update(np.ascontiguousarray(X[start : start + chunk_size]).tobytes())
+    return h.hexdigest()
+
+
+# append-only store of experiment results, one JSON line per
+# (dataset, k, method, m, repetition); every result is written and flushed
+# as soon as it is known, so a restarted sweep can skip what is done
+class ResultStore:
+    def __init__(self, path, dataset, X):
+        self.path = path
+        self.dataset = dataset
+        self.fingerprint = fingerprint(X)
+        self.results = {}
+        if not os.path.exists(path):
+            return
+        ignored = 0
+        with open(path) as fp:
+            for line in fp:
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    # last line of an interrupted write
+                    continue
+                if r["dataset"] != dataset:
+                    continue
+                if r["fingerprint"] != self.fingerprint:
+                    ignored += 1
+                    continue
+                self.results[self._key(r["k"], r["method"], r["m"], r["rep"])] = r
+        if ignored > 0:
+            print("ignoring {} results computed on different data".format(ignored))
+        # terminate an interrupted last line
+        with open(path, "rb+") as fp:
+            fp.seek(0, os.SEEK_END)
+            if fp.tell() > 0:
+                fp.seek(-1, os.SEEK_END)
+                if fp.read(1) != b"\n":
+                    fp.write(b"\n")
+
+    @staticmethod
+    def _key(k, method, m, rep):
+        return (int(k), str(method), int(m), int(rep))
+
+    def done(self, k, method, m, rep):
+        return self._key(k, method, m, rep) in self.results
+
+    def get(self, k, method, m, rep):
+        return self.results[self._key(k, method, m, rep)]
+
+    def add(self, k, method, m, rep, rss, runtime, **info):
+        r = {
+            "dataset": self.dataset,
+            "fingerprint": self.fingerprint,
+            "k": int(k),
+            "method": str(method),
+            "m": int(m),
+            "rep": int(rep),
+            "rss": float(rss),
+            "runtime": float(runtime),
+        }
+        r.update(info)
+        with open(self.path, "a") as fp:
+            fp.write(json.dumps(r) + "\n")
+            fp.flush()
+            os.fsync(fp.fileno())
+        self.results[self._key(k, method, m, rep)] = r
+
+    # rss and runtime of all repetitions of one configuration, or None if
+    # some are missing
+    def collect(self, k, method, m, repetitions):
+        if not all(self.done(k, method, m, rep) for rep in range(repetitions)):
+            return None
+        r = [self.get(k, method, m, rep) for rep in range(repetitions)]
+        return np.array([x["rss"] for x in r]), np.array([x["runtime"] for x in r])
@@ -1,89 +1,163 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import sys
 import ray
+import json
+import argparse
 
 from utils import *
 from coresets import *
 from experiments import *
+from evaluation import SampledRSS
+from resultstore import ResultStore
 from experiment_settings import *
 
 
 ray.init()
 
-dataset = str(sys.argv[1])
-X, y = load_data(dataset)  # y won't be used
+parser = argparse.ArgumentParser()
+parser.add_argument("dataset")
+parser.add_argument(
+    "--sampled-evaluation",
+    type=int,
+    default=0,
+    metavar="SIZE",
+    help="estimate the error on all data from a stratified sample of this size",
+)
+parser.add_argument(
+    "--sparse",
+    action="store_true",
+    help="keep ijcnn1 and covertype as sparse CSR matrices",
+)
+parser.add_argument(
+    "--sampling-index",
+    action="store_true",
+    help="compute the sensitivities once per data set instead of per draw",
+)
+parser.add_argument(
+    "--online-baseline",
+    action="store_true",
+    help="also run online AA on mini-batches of all data",
+)
+parser.add_argument(
+    "--telemetry",
+    action="store_true",
+    help="record phase timings, solver iterations and memory per iteration",
+)
+parser.add_argument(
+    "--float32",
+    action="store_true",
+    help="keep X in single precision, with float64 accumulation in AA",
+)
+args = parser.parse_args()
+
+dataset = args.dataset
+dtype = np.float32 if args.float32 else None
+X, y = load_data(dataset, sparse=args.sparse, dtype=dtype)  # y won't be used
+# results in single precision are kept apart
+output = results_path + dataset + ("_float32" if args.float32 else "")
+# put X into the object store once, all tasks share it
+X_id = ray.put(X)
+# every finished repetition is written here; a restart skips those
+store = ResultStore(output + "_results.jsonl", dataset, X)
+# per-iteration events of all runs, as JSON lines
+telemetry = None
+if args.telemetry:
+    telemetry = output + "_telemetry.jsonl"
+# the evaluation sample is drawn once and shared by all repetitions
+evaluation = None
+if args.sampled_evaluation > 0:
+    evaluation = ray.put(SampledRSS(X, size=args.sampled_evaluation))
 
 np.random.seed(0)
 
+# sensitivities and their CDF, shared by all repetitions and sizes
+indexes = {}
+if args.sampling_index:
+    for sampler in ["lw-cs", "abs-cs"]:
+        indexes[sampler] = ray.put(SamplingIndex(X, sampler))
+
 for k in [25, 100]:
     # k is the number of archetypes
 
     # Archetypal Analysis on all data
     print("Archetypal Analysis on all data")
-    rss_full, time_full = experiment_AA_full(X, k)
-
-    # Archetypal Analysis on uniform sample
-    print("Archetypal Analysis on uniform sample")
-    rss_uniform_sample = []
-    time_uniform_sample = []
-    for m in M:
-        res, res_time = experiment_AA_uniform_sample_parallel(X, k, m, repetitions)
-        rss_uniform_sample.append(res)
-        time_uniform_sample.append(res_time)
-    rss_uniform_sample = np.array(rss_uniform_sample)
-    time_uniform_sample = np.array(time_uniform_sample)
-
-    # Archetypal Analysis on lightweight coreset
-    print("AA on lightweight coreset")
-    rss_lw_coreset = []
-    time_lw_coreset = []
-    for m in M:
-        res, res_time = experiment_AA_lightweight_coreset_parallel(X, k, m, repetitions)
-        rss_lw_coreset.append(res)
-        time_lw_coreset.append(res_time)
-    rss_lw_coreset = np.array(rss_lw_coreset)
-    time_lw_coreset = np.array(time_lw_coreset)
+    if not store.done(k, "full", X.shape[0], 0):
+        store.add(
+            k,
+            "full",
+            X.shape[0],
+            0,
+            *experiment_AA_full(X, k, n_jobs=-1, telemetry=telemetry)
+        )
+    rss_full, time_full = [x[0] for x in store.collect(k, "full", X.shape[0], 1)]
+    online = {}
+    if args.online_baseline:
+        print("online Archetypal Analysis on all data")
+        if not store.done(k, "online", X.shape[0], 0):
+            store.add(
+                k,
+                "online",
+                X.shape[0],
+                0,
+                *experiment_AA_online(X, k, n_jobs=-1, telemetry=telemetry)
+            )
+        rss_online, time_online = [
+            x[0] for x in store.collect(k, "online", X.shape[0], 1)
+        ]
+        online = {"rss_online": rss_online, "time_online": time_online}
 
-    # Archetypal Analysis on proposed coreset
-    print("Archetypal Analysis on proposed coreset")
-    rss_coreset = []
-    time_coreset = []
-    for m in M:
-        res, res_time = experiment_AA_coreset_parallel(X, k, m, repetitions)
-        rss_coreset.append(res)
-        time_coreset.append(res_time)
-    rss_coreset = np.array(rss_coreset)
-    time_coreset = np.array(time_coreset)
+    # Archetypal Analysis on uniform sample and the three coresets
+    results = {}
+    profiles = []
+    if args.sampling_index:
+        # lucic-cs depends on k
+        indexes["lucic-cs"] = ray.put(SamplingIndex(X, "lucic-cs", k))
+    for method, sampler in [
+        ("uniform_sample", "uniform"),
+        ("lw_coreset", "lw-cs"),
+        ("coreset", "abs-cs"),
+        ("lucic_coreset", "lucic-cs"),
+    ]:
+        print("Archetypal Analysis on {}".format(sampler))
+        rss_method = []
+        time_method = []
+        for m in M:
+            res, res_time = experiment_AA_parallel(
+                X_id,
+                k,
+                m,
+                repetitions,
+                indexes.get(sampler, sampler),
+                store,
+                evaluation,
+                name=sampler,
+                telemetry=telemetry,
+            )
+            # phase timings etc. aggregated over the repetitions (None if
+            # they were run without telemetry)
+            profile = summarize_telemetry(store, k, sampler, m, repetitions)
+            if args.telemetry and profile is not None:
+                profiles.append(dict(method=sampler, m=int(m), **profile))
+            rss_method.append(res)
+            time_method.append(res_time)
+        results["rss_" + method] = np.array(rss_method)
+        results["time_" + method] = np.array(time_method)
 
-    # Archetypal Analysis on lucic coreset
-    print("Archetypal Analysis on lucic coreset")
-    rss_lucic_coreset = []
-    time_lucic_coreset = []
-    for m in M:
-        res, res_time = experiment_AA_lucic_coreset_parallel(X, k, m, repetitions)
-        rss_lucic_coreset.append(res)
-        time_lucic_coreset.append(res_time)
-    rss_lucic_coreset = np.array(rss_lucic_coreset)
-    time_lucic_coreset = np.array(time_lucic_coreset)
+    if args.telemetry:
+        with open(output + "_telemetry_k{}.json".format(k), "w") as fp:
+            json.dump(profiles, fp, indent=1)
 
     # save results in npz file
     np.savez(
-        results_path + dataset + "_coreset_k{}.npz".format(k),
+        output + "_coreset_k{}.npz".format(k),
         dataset=dataset,
-        X=X,
+        fingerprint=store.fingerprint,
         k=k,
         repetitions=repetitions,
         M=M,
         rss_full=rss_full,
         time_full=time_full,
-        rss_lucic_coreset=rss_lucic_coreset,
-        time_lucic_coreset=time_lucic_coreset,
-        rss_uniform_sample=rss_uniform_sample,
-        time_uniform_sample=time_uniform_sample,
-        rss_lw_coreset=rss_lw_coreset,
-        time_lw_coreset=time_lw_coreset,
-        rss_coreset=rss_coreset,
-        time_coreset=time_coreset,
+        **online,
+        **results
     )
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+# Euclidean projection of every row of V onto the probability simplex
+def project_simplex(V):
+    # Efficient Projections onto the l1-Ball for Learning in High Dimensions
+    # Duchi et al. (2008)
+    r, k = V.shape
+    U = -np.sort(-V, axis=1)
+    css = np.cumsum(U, axis=1) - 1
+    cond = U - css / np.arange(1, k + 1) > 0
+    # last index where the condition holds
+    rho = k - 1 - np.argmax(cond[:, ::-1], axis=1)
+    theta = css[np.arange(r), rho] / (rho + 1)
+    return np.maximum(V - theta[:, None], 0.0)
+
+
+# solve  min_a || Z^t a - x ||_2  s.t.  a >= 0, sum(a) = 1  for every row
+# of C = X Z^t, given G = Z Z^t; i.e., the A-step without the M penalty;
+# rows stop once their Frank-Wolfe duality gap, an upper bound on their
+# distance to the optimum, is below tol times the largest eigenvalue of G
+def simplex_lstsq_gram(G, C, A0=None, max_iter=1000, tol=1e-9):
+    L = np.linalg.eigvalsh(G)[-1]
+    A, iterations = _fista(
+        lambda Y, rows: np.dot(Y, G) - C[rows], L, C.shape, A0, max_iter, tol * L
+    )
+    capped = np.count_nonzero(iterations >= max_iter)
+    if capped > 0:
+        print(
+            "simplex_lstsq_gram() reached max. iterations for %d of %d rows; "
+            "possibly not converged" % (capped, C.shape[0])
+        )
+    return A, iterations
+
+
+# accelerated projected gradient for all rows at once; converged rows
+# drop out, every row has its own momentum which is restarted whenever
+# it points uphill (O'Donoghue and Candes, 2015)
+def _fista(grad, L, shape, A0, max_iter, tol):
+    r, k = shape
+    if A0 is None:
+        A = np.full(shape, 1.0 / k)
+    else:
+        A = project_simplex(np.asarray(A0, dtype=float))
+    Y = A.copy()
+    t = np.ones(r)
+    iterations = np.zeros(r, dtype=int)
+    rows = np.arange(r)
+    for _ in range(max_iter):
+        A_new = project_simplex(Y[rows] - grad(Y[rows], rows) / L)
+        step = A_new - A[rows]
+        iterations[rows] += 1
+        # restart the momentum of rows where it points uphill
+        uphill = np.sum((Y[rows] - A_new) * step, axis=1) > 0
+        t_new = (1 + np.sqrt(1 + 4 * t[rows] ** 2)) / 2
+        t_new[uphill] = 1.0
+        beta = np.where(uphill, 0.0, (t[rows] - 1) / t_new)
+        A[rows] = A_new
+        Y[rows] = A_new + beta[:, None] * step
+        t[rows] = t_new
+        # duality gap a^t g - min(g) at the new (feasible) iterate
+        g = grad(A_new, rows)
+        gap = np.sum(A_new * g, axis=1) - g.min(axis=1)
+        rows = rows[gap > tol]
+        if rows.size == 0:
+            break
+    return A, iterations
+
+
+# solve  min_b || X^t b - z ||_2  s.t.  b >= 0, sum(b) = 1  for every row z
+# of Z, working on X directly; i.e., the B-step without the M penalty,
+# solved exactly by an active-set method (see _simplex_active); B0
+# warm-starts each row from the support of a previous solution
+def simplex_lstsq(X, Z, B0=None, max_iter=None, tol=None):
+    n = X.shape[0]
+    if tol is None:
+        tol = simplex_tol(X)
+    B = np.zeros((Z.shape[0], n))
+    iterations = np.zeros(Z.shape[0], dtype=int)
+    capped = 0
+    for j in range(Z.shape[0]):
+        P = None if B0 is None else B0[j] > 0
+        B[j], iterations[j], converged = _simplex_active(X, Z[j], P, max_iter, tol)
+        capped += not converged
+    if capped > 0:
+        print(
+            "simplex_lstsq() reached max. iterations for %d of %d rows; "
+            "possibly not converged" % (capped, Z.shape[0])
+        )
+    return B, iterations
+
+
+# default tolerance of simplex_lstsq on the duality gap, relative to the
+# largest squared norm of the rows of X
+def simplex_tol(X):
+    return 1e-10 * max(np.sum(X ** 2, axis=1).max(), 1.0)
+
+
+# Lawson-Hanson for the simplex constraint: the passive set P grows by the
+# column with the smallest gradient until the duality gap  b^t g - min(g)
+# is below tol, the least-squares problems on P keep sum(b) = 1 exactly
+# (see _affine_lstsq), steps back into the feasible region drop columns
+def _simplex_active(X, z, P=None, max_iter=None, tol=1e-10):
+    n = X.shape[0]
+    if max_iter is None:
+        max_iter = 3 * n
+    feasible_tol = 10 * n * np.finfo(float).eps
+    b = np.zeros(n)
+    iterations = 0
+    if P is not None and P.any():
+        # warm start: shrink the given passive set until feasible
+        P = P.copy()
+        while P.any():
+            iterations += 1
+            s = _affine_lstsq(X[P], z)
+            if (s > feasible_tol).all():
+                b[P] = s
+                break
+            P[np.flatnonzero(P)[s <= feasible_tol]] = False
+    if P is None or not P.any():
+        # cold start from the closest point, a vertex of the simplex
+        P = np.zeros(n, dtype=bool)
+        j = np.sum((X - z) ** 2, axis=1).argmin()
+        P[j] = True
+        b[:] = 0.0
+        b[j] = 1.0
+
+    converged = False
+    while True:
+        g = np.dot(X, np.dot(b[P], X[P]) - z)
+        gt = np.where(P, np.inf, g)
+        j = gt.argmin()
+        if np.dot(b, g) - gt[j] <= tol:
+            converged = True
+            break
+        if iterations >= max_iter:
+            break
+        P[j] = True
+        iterations += 1
+        s = np.zeros(n)
+        s[P] = _affine_lstsq(X[P], z)
+        # inner loop: step back into the feasible region
+        while (s[P] <= feasible_tol).any() and iterations < max_iter:
+            iterations += 1
+            neg = P & (s <= feasible_tol)
+            alpha = (b[neg] / (b[neg] - s[neg])).min()
+            b = b + alpha * (s - b)
+            P &= b > feasible_tol
+            b[~P] = 0.0
+            b /= b.sum()
+            s = np.zeros(n)
+            s[P] = _affine_lstsq(X[P], z)
+        if (s[P] <= feasible_tol).any():
+            # cut off: keep the last feasible b
+            break
+        b = s
+    return b, iterations, converged
+
+
+# min_s || X^t s - z ||_2  s.t.  sum(s) = 1, without sign constraints:
+# s = e_0 + sum_i t_i (e_i - e_0), i.e. a least-squares problem in the
+# differences x_i - x_0 (minimum-norm t if they are linearly dependent)
+def _affine_lstsq(X, z):
+    if X.shape[0] == 1:
+        return np.ones(1)
+    t = np.linalg.lstsq((X[1:] - X[0]).T, z - X[0], rcond=None)[0]
+    return np.hstack((1 - t.sum(), t))
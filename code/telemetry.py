@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import resource
+import tracemalloc
+import numpy as np
+from time import perf_counter
+from contextlib import contextmanager, nullcontext
+
+
+# event sink for the AA loops: wall time of each phase (A-step, Z update,
+# B-step, RSS, ...), solver iterations and the memory high-water mark, one
+# event per iteration; events are kept in memory and, given a path,
+# appended to it as JSON lines; context is added to every event
+class Telemetry:
+    def __init__(self, path=None, trace_memory=False, slow_rows=5, **context):
+        self.path = path
+        self.trace_memory = trace_memory
+        self.slow_rows = slow_rows
+        self.context = context
+        self.events = []
+        self._time = {}
+        self._peak = {}
+        if trace_memory and not tracemalloc.is_tracing():
+            # peak of the numpy allocations per phase, at a cost
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        t_start = perf_counter()
+        try:
+            yield
+        finally:
+            self._time[name] = self._time.get(name, 0.0) + perf_counter() - t_start
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                self._peak[name] = max(self._peak.get(name, 0), peak)
+
+    # end of an iteration; iterations_A/B are the per-row / per-archetype
+    # solver iterations as returned by the compute_A/B functions, None if
+    # the solver did not count them
+    def iteration(self, iteration, rss, iterations_A=None, iterations_B=None):
+        event = {"event": "iteration", "iteration": int(iteration), "rss": float(rss)}
+        if iterations_A is not None:
+            event["iterations_A"] = self._iterations(iterations_A)
+        if iterations_B is not None:
+            event["iterations_B"] = self._iterations(iterations_B)
+        self.emit(event)
+
+    # end of the run, with the phases after the last iteration
+    def finish(self, **fields):
+        self.emit(dict(event="finish", **fields))
+
+    def emit(self, event):
+        event.update(self.context)
+        event["time"] = self._time
+        # peak resident set size of the process so far, in MB
+        event["maxrss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        if self.trace_memory:
+            event["peak"] = {k: v / 2.0 ** 20 for k, v in self._peak.items()}
+        self._time = {}
+        self._peak = {}
+        self.events.append(event)
+        if self.path is not None:
+            # one write per line, so that workers can share the file
+            with open(self.path, "a") as fp:
+                fp.write(json.dumps(event) + "\n")
+
+    def _iterations(self, iterations):
+        iterations = np.asarray(iterations)
+        slow = np.argsort(iterations)[::-1][: self.slow_rows]
+        return {
+            "sum": int(iterations.sum()),
+            "max": int(iterations.max()) if iterations.size > 0 else 0,
+            "slow": slow.tolist(),
+        }
+
+    # totals of one run: iterations, time per phase, solver iterations
+    # and the memory high-water mark
+    def summary(self):
+        time = {}
+        for event in self.events:
+            for name, t in event["time"].items():
+                time[name] = time.get(name, 0.0) + t
+        its = [e for e in self.events if e["event"] == "iteration"]
+        summary = {
+            "iterations": len(its),
+            "time": time,
+            "maxrss": max([e["maxrss"] for e in self.events], default=0.0),
+        }
+        for key in ["iterations_A", "iterations_B"]:
+            counted = [e[key]["sum"] for e in its if key in e]
+            if counted:
+                summary[key] = sum(counted)
+        return summary
+
+
+# the default: no events, and each phase costs a nullcontext
+class _NoTelemetry:
+    def phase(self, name):
+        return nullcontext()
+
+    def iteration(self, *args, **kwargs):
+        pass
+
+    def finish(self, **fields):
+        pass
+
+
+no_telemetry = _NoTelemetry()
+
+
+# mean and standard deviation of the summaries of several runs, e.g. the
+# repetitions of one configuration
+def aggregate(summaries):
+    summaries = [s for s in summaries if s is not None]
+    if len(summaries) == 0:
+        return None
+    keys = ["iterations", "iterations_A", "iterations_B", "maxrss"]
+    values = {key: [] for key in keys}
+    for s in summaries:
+        for key in keys:
+            if key in s:
+                values[key].append(s[key])
+        for name, t in s["time"].items():
+            values.setdefault("time_" + name, []).append(t)
+    result = {"runs": len(summaries)}
+    for key, v in values.items():
+        if len(v) == 0:
+            # solver iterations not counted in any run
+            continue
+        if key.startswith("time_") and len(v) < len(summaries):
+            # phase missing in some runs
+            v = v + [0.0] * (len(summaries) - len(v))
+        result[key] = {"mean": float(np.mean(v)), "std": float(np.std(v))}
+    return result
@@ -1,48 +1,176 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+import json
+import hashlib
 import numpy as np
+import scipy.sparse as sp
+import multiprocessing as mp
 from tqdm import tqdm
 from sklearn.preprocessing import StandardScaler
 from sklearn.datasets import load_svmlight_file
 
 from experiment_settings import *
+from parallel import effective_n_jobs
 
 
-def load_data(dataset, standardize=False):
+def load_data(
+    dataset,
+    standardize=False,
+    cache=True,
+    mmap=True,
+    n_jobs=-1,
+    sparse=False,
+    dtype=None,
+):
+    # parsing the text files takes minutes, so every data set is converted
+    # once into .npy files in cache_path which are memory-mapped afterwards;
+    # with sparse=True the svmlight data sets are returned as CSR matrices;
+    # dtype=np.float32 halves the memory of X (the cache stays float64, so
+    # X is then read into memory), AA accumulates in float64 nevertheless
+    if cache:
+        X, y = _load_cached(dataset, mmap, n_jobs, sparse)
+    else:
+        X, y = _parse(dataset, n_jobs, sparse)
+
+    if standardize:
+        # centering would make sparse data dense
+        X = StandardScaler(with_mean=not sp.issparse(X)).fit_transform(X)
+
+    if dtype is not None and X.dtype != dtype:
+        X = X.astype(dtype)
+
+    return X, y
+
+
+def _source_files(dataset):
+    if dataset == "covertype":
+        return [data_path + "covtype.libsvm.binary"]
+    elif dataset == "ijcnn1":
+        return [data_path + "ijcnn1/ijcnn1"]
+    elif dataset == "song":
+        return [data_path + "YearPredictionMSD.txt"]
+    elif dataset == "pose":
+        return [
+            data_path + "Human3.6M/ECCV18_Challenge/Train/POSE/{:05d}.csv".format(i)
+            for i in range(1, 35832 + 1)
+        ]
+    else:
+        raise NotImplementedError
+
+
+def _parse(dataset, n_jobs=-1, sparse=False):
     X = []
     y = []
 
     if dataset == "covertype":  # (581012, 54)
         # Forest cover type
         # https://archive.ics.uci.edu/ml/datasets/covertype
-        X, y = load_svmlight_file(data_path + "covtype.libsvm.binary")
+        X, y = load_svmlight_file(_source_files(dataset)[0])
+        if sparse:
+            return sp.csr_matrix(X, dtype=float), np.asarray(y, dtype=float)
         X = np.asarray(X.todense())
     elif dataset == "ijcnn1":  # (49990, 22)
         # https://www.csie.ntu.edu.tw/~cjlin/libsvmtools/datasets/binary.html
-        X, y = load_svmlight_file(data_path + "ijcnn1/ijcnn1")
+        X, y = load_svmlight_file(_source_files(dataset)[0])
+        if sparse:
+            return sp.csr_matrix(X, dtype=float), np.asarray(y, dtype=float)
         X = np.asarray(X.todense())
     elif dataset == "song":  # (515345, 90)
         # YearPredictionMSD is a subset of the Million Song Dataset
         # https://archive.ics.uci.edu/ml/datasets/yearpredictionmsd
-        data = np.loadtxt(
-            data_path + "YearPredictionMSD.txt", skiprows=0, delimiter=","
-        )
+        data = np.loadtxt(_source_files(dataset)[0], skiprows=0, delimiter=",")
         X = data[:, 1:]
         y = data[:, 0]
     elif dataset == "pose":  # (35832, 48)
         # ECCV 2018 PoseTrack Challenge
         # http://vision.imar.ro/human3.6m/challenge_open.php
-        X = []
-        for i in tqdm(range(1, 35832 + 1), desc="loading pose"):
-            f = data_path + "Human3.6M/ECCV18_Challenge/Train/POSE/{:05d}.csv".format(i)
-            data = np.loadtxt(f, skiprows=0, delimiter=",")
-            X.append(data[1:, :].flatten())
+        files = _source_files(dataset)
+        n_jobs = effective_n_jobs(n_jobs)
+        if n_jobs > 1:
+            with mp.Pool(n_jobs) as pool:
+                X = pool.map(_parse_pose_file, files, chunksize=256)
+        else:
+            X = [_parse_pose_file(f) for f in tqdm(files, desc="loading pose")]
         X = np.array(X)
     else:
         raise NotImplementedError
 
-    if standardize:
-        X = StandardScaler().fit_transform(X)
+    return np.asarray(X, dtype=float), np.asarray(y, dtype=float)
 
+
+def _parse_pose_file(f):
+    data = np.loadtxt(f, skiprows=0, delimiter=",")
+    return data[1:, :].flatten()
+
+
+# size and modification time of the source files, cheap to check
+def _source_stat(files):
+    return [[os.path.getsize(f), os.path.getmtime(f)] for f in files]
+
+
+def _source_checksum(files):
+    h = hashlib.sha256()
+    for f in files:
+        with open(f, "rb") as fp:
+            for block in iter(lambda: fp.read(2**20), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+def _load_cached(dataset, mmap=True, n_jobs=-1, sparse=False):
+    files = _source_files(dataset)
+    prefix = os.path.join(cache_path, dataset)
+    if sparse and dataset in ("covertype", "ijcnn1"):
+        # CSR arrays are cached separately
+        prefix += "_csr"
+    else:
+        sparse = False
+    meta_file = prefix + ".json"
+
+    meta = None
+    if os.path.exists(meta_file):
+        with open(meta_file) as fp:
+            meta = json.load(fp)
+        if meta["stat"] != _source_stat(files):
+            # the files were touched; only a different checksum invalidates
+            if meta["checksum"] == _source_checksum(files):
+                meta["stat"] = _source_stat(files)
+                with open(meta_file, "w") as fp:
+                    json.dump(meta, fp)
+            else:
+                meta = None
+
+    if meta is None:
+        X, y = _parse(dataset, n_jobs, sparse)
+        os.makedirs(cache_path, exist_ok=True)
+        if sparse:
+            np.save(prefix + "_data.npy", X.data)
+            np.save(prefix + "_indices.npy", X.indices)
+            np.save(prefix + "_indptr.npy", X.indptr)
+        else:
+            np.save(prefix + "_X.npy", X)
+        np.save(prefix + "_y.npy", y)
+        meta = {
+            "dataset": dataset,
+            "shape": list(X.shape),
+            "dtype": str(X.dtype),
+            "stat": _source_stat(files),
+            "checksum": _source_checksum(files),
+        }
+        # written last, so an interrupted conversion is redone
+        with open(meta_file, "w") as fp:
+            json.dump(meta, fp)
+
+    mmap_mode = "r" if mmap else None
+    if sparse:
+        arrays = [
+            np.load(prefix + "_" + name + ".npy", mmap_mode=mmap_mode)
+            for name in ("data", "indices", "indptr")
+        ]
+        X = sp.csr_matrix(tuple(arrays), shape=tuple(meta["shape"]), copy=False)
+    else:
+        X = np.load(prefix + "_X.npy", mmap_mode=mmap_mode)
+    y = np.load(prefix + "_y.npy", mmap_mode=mmap_mode)
     return X, y